@@ -0,0 +1,48 @@
+import random
+import sys
+import time
+
+from tankbot.leaderboard import Leaderboard
+
+# Micro-benchmark for tank-name autocomplete (Leaderboard.search_tanks) on a
+# synthetic 1000-tank roster. Autocomplete runs on every keystroke, so each
+# query should take microseconds.
+
+ROSTER_SIZE = 1000
+ROUNDS = 2000
+
+def roster(n: int, seed: int = 7) -> list[tuple[str, int, str]]:
+    rnd = random.Random(seed)
+    prefixes = ["T", "IS", "KV", "M", "Obj", "AMX", "Leopard", "Panther", "Tiger", "Centurion", "Type", "STB", "FV", "Jg.Pz."]
+    names = set()
+    while len(names) < n:
+        names.add(f"{rnd.choice(prefixes)}-{rnd.randint(1, 999)}{rnd.choice(['', ' A', ' B', ' mod', ' II'])}")
+    return [(name, rnd.randint(1, 10), rnd.choice(["light", "medium", "heavy", "td"])) for name in sorted(names)]
+
+def bench(lb: Leaderboard, queries: list[str]) -> float:
+    """Mean microseconds per search_tanks() call."""
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        for q in queries:
+            lb.search_tanks(q)
+    return (time.perf_counter() - started) / (ROUNDS * len(queries)) * 1e6
+
+def main() -> int:
+    tanks = roster(ROSTER_SIZE)
+    lb = Leaderboard()
+    started = time.perf_counter()
+    lb.load(tanks, [])
+    print(f"load {len(tanks)} tanks: {(time.perf_counter() - started) * 1000:.2f} ms")
+
+    cases = {
+        "empty": [""],
+        "prefix": ["t", "is-", "leo", "panther-1", "obj-2"],
+        "fuzzy": ["tigr-12", "centurian", "lepard-5", "pnther 3", "amx-1o"],
+        "no match": ["zzzz", "qwerty"],
+    }
+    for label, queries in cases.items():
+        print(f"{label:>9}: {bench(lb, queries):7.1f} us/query  e.g. {queries[0]!r} -> {lb.search_tanks(queries[0])[:3]}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,20 @@
+import sys
+import asyncio
+
+from tankbot import db
+
+async def main() -> int:
+    await db.init_db()
+    try:
+        bad = await db.check_query_plans()
+    finally:
+        await db.close_db()
+    for name, plan in bad:
+        print(f"SCAN  {name}: {plan}")
+    if bad:
+        return 1
+    print("OK: all hot queries use an index.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,28 @@
+import logging
+
+from discord.ext import tasks
+
+from . import config, db
+from .utils import utc_now_z
+
+log = logging.getLogger(__name__)
+
+_last_run: tuple[str, int] | None = None   # (utc time, rows moved)
+
+def last_archive_status():
+    return _last_run
+
+async def run_archive() -> int:
+    global _last_run
+    if config.ARCHIVE_AFTER_DAYS <= 0:
+        return 0
+    moved = await db.archive_submissions(config.ARCHIVE_AFTER_DAYS, config.ARCHIVE_BATCH_SIZE)
+    _last_run = (utc_now_z(), moved)
+    return moved
+
+@tasks.loop(hours=config.ARCHIVE_INTERVAL_HOURS)
+async def archive_loop():
+    try:
+        await run_archive()
+    except Exception as e:
+        log.error(f"Archive run failed: {type(e).__name__}: {e}")
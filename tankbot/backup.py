@@ -49,13 +49,17 @@ async def create_backup_file() -> tuple[str, str, str]:
         raise FileNotFoundError(f"DB not found: {config.DB_PATH}")
 
     ts = dt.datetime.utcnow().strftime("%Y%m%d_%H%M%SZ")
-    tmp_db = f"{config.DB_PATH}.{ts}.backup.db"
     zip_name = f"highscores_backup_{ts}.zip"
     zip_path = os.path.join(os.getcwd(), zip_name)
 
-    def _sqlite_backup():
+    # (source, temp copy, name in zip); history.db holds archived submissions.
+    files = [(config.DB_PATH, f"{config.DB_PATH}.{ts}.backup.db", "highscores.db")]
+    if os.path.exists(config.HISTORY_DB_PATH):
+        files.append((config.HISTORY_DB_PATH, f"{config.HISTORY_DB_PATH}.{ts}.backup.db", "history.db"))
+
+    def _sqlite_backup(src_path: str, tmp_db: str):
         # Use SQLite backup API for a consistent snapshot.
-        src = sqlite3.connect(config.DB_PATH)
+        src = sqlite3.connect(src_path)
         try:
             dst = sqlite3.connect(tmp_db)
             try:
@@ -66,16 +70,18 @@ async def create_backup_file() -> tuple[str, str, str]:
         finally:
             src.close()
 
-    await asyncio.to_thread(_sqlite_backup)
-
     try:
+        for src_path, tmp_db, _ in files:
+            await asyncio.to_thread(_sqlite_backup, src_path, tmp_db)
         with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as z:
-            z.write(tmp_db, arcname="highscores.db")
+            for _, tmp_db, arcname in files:
+                z.write(tmp_db, arcname=arcname)
     finally:
-        try:
-            os.remove(tmp_db)
-        except Exception:
-            pass
+        for _, tmp_db, _ in files:
+            try:
+                os.remove(tmp_db)
+            except Exception:
+                pass
 
     fernet, salt_b64 = _derive_fernet()
     note = ""
@@ -86,14 +92,8 @@ async def create_backup_file() -> tuple[str, str, str]:
         enc = fernet.encrypt(data)
 
         # Self-contained format:
-        # TANKBOT1
-SALT_B64:<salt>
-
-<ciphertext>
-        header = f"TANKBOT1
-SALT_B64:{salt_b64}
-
-".encode("utf-8")
+        # TANKBOT1\nSALT_B64:<salt>\n\n<ciphertext>
+        header = f"TANKBOT1\nSALT_B64:{salt_b64}\n\n".encode("utf-8")
         blob = header + enc
 
         out_path = zip_path + ".enc"
@@ -313,20 +313,24 @@ async def verify_latest_backup(bot: discord.Client, scan_limit: int = 50) -> tup
         zf = zipfile.ZipFile(io.BytesIO(zip_bytes), "r")
         if "highscores.db" not in zf.namelist():
             return False, "Zip does not contain highscores.db"
-        db_bytes = zf.read("highscores.db")
-
-        with tempfile.NamedTemporaryFile(suffix=".db", delete=True) as tmp:
-            tmp.write(db_bytes)
-            tmp.flush()
-            con = sqlite3.connect(tmp.name)
-            try:
-                row = con.execute("PRAGMA integrity_check;").fetchone()
-                ok = (row and row[0] == "ok")
-            finally:
-                con.close()
-
+        # Older backups predate the history archive and have no history.db.
+        names = [n for n in ("highscores.db", "history.db") if n in zf.namelist()]
+
+        ok = True
+        for name in names:
+            with tempfile.NamedTemporaryFile(suffix=".db", delete=True) as tmp:
+                tmp.write(zf.read(name))
+                tmp.flush()
+                con = sqlite3.connect(tmp.name)
+                try:
+                    row = con.execute("PRAGMA integrity_check;").fetchone()
+                    ok = ok and bool(row and row[0] == "ok")
+                finally:
+                    con.close()
+
+        checked = " + ".join(names)
         if ok:
-            return True, f"✅ Verified `{att.filename}` — integrity_check=ok — sha256={sha[:12]}…"
-        return False, f"❌ Verified `{att.filename}` — integrity_check FAILED — sha256={sha[:12]}…"
+            return True, f"✅ Verified `{att.filename}` ({checked}) — integrity_check=ok — sha256={sha[:12]}…"
+        return False, f"❌ Verified `{att.filename}` ({checked}) — integrity_check FAILED — sha256={sha[:12]}…"
     except Exception as e:
         return False, f"❌ Verify failed for `{att.filename}`: {type(e).__name__}: {e}"
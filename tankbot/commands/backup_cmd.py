@@ -43,15 +43,14 @@ def register(tree: app_commands.CommandTree, bot: discord.Client, guild: discord
             ephemeral=True
         )
 
-
-@grp.command(name="verify_latest", description="Verify the latest backup file in the backup channel (admins only)")
-@app_commands.describe(scan_limit="How many recent messages to scan (10-200)")
-async def verify_latest(interaction: discord.Interaction, scan_limit: int = 50):
-    member = interaction.user
-    if not isinstance(member, discord.Member) or not utils.can_manage(member):
-        await interaction.response.send_message("Nope. You need **Manage Server** to verify backups.", ephemeral=True)
-        return
-    scan_limit = max(10, min(scan_limit, 200))
-    await interaction.response.send_message("Verifying latest backup…", ephemeral=True)
-    ok, msg = await backup.verify_latest_backup(bot, scan_limit=scan_limit)
-    await interaction.followup.send(("✅ " if ok else "❌ ") + msg, ephemeral=True)
+    @grp.command(name="verify_latest", description="Verify the latest backup file in the backup channel (admins only)")
+    @app_commands.describe(scan_limit="How many recent messages to scan (10-200)")
+    async def verify_latest(interaction: discord.Interaction, scan_limit: int = 50):
+        member = interaction.user
+        if not isinstance(member, discord.Member) or not utils.can_manage(member):
+            await interaction.response.send_message("Nope. You need **Manage Server** to verify backups.", ephemeral=True)
+            return
+        scan_limit = max(10, min(scan_limit, 200))
+        await interaction.response.send_message("Verifying latest backup…", ephemeral=True)
+        ok, msg = await backup.verify_latest_backup(bot, scan_limit=scan_limit)
+        await interaction.followup.send(("✅ " if ok else "❌ ") + msg, ephemeral=True)
@@ -0,0 +1,13 @@
+import discord
+from discord import app_commands
+
+from .. import db
+
+async def tank_names(interaction: discord.Interaction, current: str) -> list[app_commands.Choice[str]]:
+    """Autocomplete for tank arguments, answered from the in-memory roster index."""
+    return [app_commands.Choice(name=n, value=n) for n in db.search_tanks(current)]
+
+def did_you_mean(tank: str) -> str:
+    """' Did you mean **X**?' for a mistyped tank name, or ''."""
+    hits = db.search_tanks(tank, limit=1)
+    return f" Did you mean **{hits[0]}**?" if hits else ""
@@ -16,6 +16,8 @@ def register(tree: app_commands.CommandTree):
         lines.append("- `/highscore show` — show current champion")
         lines.append("- `/highscore history` — recent results + stats")
         lines.append("- `/highscore qualify` — check if a score would qualify")
+        lines.append("- `/highscore rank` — see what rank a score would get")
+        lines.append("- `/highscore player` — a player's bests, records and ranks")
         lines.append("")
 
         if is_commander:
@@ -26,6 +28,7 @@ def register(tree: app_commands.CommandTree):
         if is_admin:
             lines.append("**Admin commands:**")
             lines.append("- `/tank …` — manage tank roster")
+            lines.append("- `/highscore import_csv` — bulk import submissions")
             lines.append("- `/backup …` — backups and status")
             lines.append("- `/system health` — system health")
             lines.append("")
@@ -1,7 +1,22 @@
+import io
+import csv
+import time
+import logging
 import discord
 from discord import app_commands
 
-from .. import config, db, utils, forum_index
+from .. import config, db, utils, forum_index, jobs
+from . import choices, paging
+
+log = logging.getLogger(__name__)
+
+async def _announce(client: discord.Client, text: str):
+    if not config.ANNOUNCE_CHANNEL_ID:
+        return
+    ch = client.get_channel(config.ANNOUNCE_CHANNEL_ID)
+    if ch is None:
+        ch = await client.fetch_channel(config.ANNOUNCE_CHANNEL_ID)
+    await ch.send(text)
 
 class Highscore(app_commands.Group):
     def __init__(self):
@@ -13,76 +28,107 @@ def register(tree: app_commands.CommandTree, bot: discord.Client, guild: discord
 
     @grp.command(name="submit", description="Submit a new highscore (commanders only)")
     @app_commands.describe(player="Player name", tank="Tank name", score="Score (1..100000)")
+    @app_commands.autocomplete(tank=choices.tank_names)
     async def submit(interaction: discord.Interaction, player: str, tank: str, score: int):
+        # Acknowledge first so Discord latency can't push us past the 3 s deadline.
+        await interaction.response.defer(ephemeral=True, thinking=True)
         member = interaction.user
         if not isinstance(member, discord.Member) or not utils.has_commander_role(member):
-            await interaction.response.send_message("Nope. Only **Clan Commanders** can submit.", ephemeral=True)
+            await interaction.followup.send("Nope. Only **Clan Commanders** can submit.", ephemeral=True)
             return
         tank = utils.validate_text('Tank', tank, 64)
         if not (1 <= score <= config.MAX_SCORE):
-            await interaction.response.send_message(f"Score must be between 1 and {config.MAX_SCORE}.", ephemeral=True)
+            await interaction.followup.send(f"Score must be between 1 and {config.MAX_SCORE}.", ephemeral=True)
             return
         t = await db.get_tank(tank)
         if not t:
-            await interaction.response.send_message("Unknown tank. Use an existing tank from the roster.", ephemeral=True)
+            await interaction.followup.send("Unknown tank. Use an existing tank from the roster." + choices.did_you_mean(tank), ephemeral=True)
             return
 
         player_raw = utils.validate_text('Player', player, 64)
-        player_norm = utils.normalize_player(player_raw)# Store submission
-await db.insert_submission(player_raw, player_norm, tank, score, interaction.user.display_name, utils.utc_now_z())
-
-# Update bucket thread (tier/type)
-_, tier, ttype = t
-await forum_index.targeted_update(bot, int(tier), str(ttype))
-
-# Announce if this is a NEW tank record
-best = await db.get_best_for_tank(tank)
-# best will be this submission if it's highest; but due to query ordering, it should be.
-if best and best[1] == player_raw and best[2] == score:
-    ch = interaction.client.get_channel(config.ANNOUNCE_CHANNEL_ID)
-    if ch is None:
+        player_norm = utils.normalize_player(player_raw)
+
+        # Store submission
         try:
-            ch = await interaction.client.fetch_channel(config.ANNOUNCE_CHANNEL_ID)
-        except Exception:
-            ch = None
-    if ch is not None:
-        await ch.send(f"🏆 **NEW TANK RECORD** — **{score}** by **{player_raw}** on **{tank}** (Tier {tier}, {utils.title_case_type(ttype)})")
+            sid = await db.insert_submission(player_raw, player_norm, tank, score, interaction.user.display_name, utils.utc_now_z())
+        except Exception as e:
+            log.error(f"Storing submission for {player_raw} on {tank} failed: {type(e).__name__}: {e}")
+            await interaction.followup.send("❌ Could not store submission, please try again.", ephemeral=True)
+            return
 
-await interaction.response.send_message("✅ Submission stored.", ephemeral=True)
+        # Refresh bucket thread (tier/type) and announce in the background, answer now
+        _, tier, ttype = t
+        forum_index.schedule_update(bot, int(tier), str(ttype))
+        best = await db.get_best_for_tank(tank)
+        is_record = best is not None and best[0] == sid
+        if is_record:
+            text = f"🏆 **NEW TANK RECORD** — **{score}** by **{player_raw}** on **{tank}** (Tier {tier}, {utils.title_case_type(ttype)})"
+            jobs.submit(f"announce #{sid}", lambda: _announce(interaction.client, text))
+        await interaction.followup.send(
+            "✅ Submission stored." + (" 🏆 New tank record!" if is_record else ""), ephemeral=True
+        )
 
     @grp.command(name="show", description="Show current champion (filters optional)")
-@app_commands.describe(tier="Filter by tier (1..10)", type="Filter by type (light/medium/heavy/td)")
-async def show(interaction: discord.Interaction, tier: int | None = None, type: str | None = None):
-    if tier is not None and not (1 <= tier <= 10):
-        await interaction.response.send_message("Tier must be 1..10.", ephemeral=True)
-        return
-    if type is not None:
-        type = type.strip().lower()
-        if type not in ("light","medium","heavy","td"):
-            await interaction.response.send_message("Type must be one of: light, medium, heavy, td.", ephemeral=True)
+    @app_commands.describe(tier="Filter by tier (1..10)", type="Filter by type (light/medium/heavy/td)",
+                           window="Only this week / month / season (default: all time)")
+    async def show(interaction: discord.Interaction, tier: int | None = None, type: str | None = None,
+                   window: str | None = None):
+        if tier is not None and not (1 <= tier <= 10):
+            await interaction.response.send_message("Tier must be 1..10.", ephemeral=True)
+            return
+        if type is not None:
+            type = type.strip().lower()
+            if type not in ("light","medium","heavy","td"):
+                await interaction.response.send_message("Type must be one of: light, medium, heavy, td.", ephemeral=True)
+                return
+        if window is not None:
+            window = window.strip().lower()
+            if window not in db.WINDOWS:
+                await interaction.response.send_message("Window must be one of: week, month, season.", ephemeral=True)
+                return
+            await _show_window(interaction, window, tier, type)
             return
 
-    champ = await db.get_champion_filtered(tier=tier, ttype=type)
-    if not champ:
-        await interaction.response.send_message("No submissions found for that filter.", ephemeral=True)
-        return
-
-    cid, player, tank, score, submitted_by, created, ctier, ctype = champ
-    label = "Global champion" if tier is None and type is None else "Champion"
-    await interaction.response.send_message(
-        f"🏆 **{label}**
-**{score}** — **{player}** ({tank}) • Tier {ctier} {utils.title_case_type(ctype)} • #{cid} • {created}Z",
-        ephemeral=True
-    )
+        champ = await db.get_champion_filtered(tier=tier, ttype=type)
+        if not champ:
+            await interaction.response.send_message("No submissions found for that filter.", ephemeral=True)
             return
+
         cid, player, tank, score, submitted_by, created, ctier, ctype = champ
+        label = "Global champion" if tier is None and type is None else "Champion"
         await interaction.response.send_message(
-            f"🏆 **Global champion**\n**{score}** — **{player}** ({tank}) • #{cid} • {created}Z",
+            f"🏆 **{label}**\n**{score}** — **{player}** ({tank}) • Tier {ctier} {utils.title_case_type(ctype)} • #{cid} • {created}Z",
             ephemeral=True
         )
 
+    async def _show_window(interaction: discord.Interaction, window: str, tier: int | None, ttype: str | None):
+        period = db.window_period(window)
+        label = {"week": "This week", "month": "This month", "season": "This season"}[window]
+        champ = await db.window_champion(window, period, tier, ttype)
+        if not champ:
+            await interaction.response.send_message(f"No submissions {label.lower()} (`{period}`) for that filter.", ephemeral=True)
+            return
+
+        cid, player, tank, score, submitted_by, created, ctier, ctype = champ
+        lines = []
+        lines.append(f"🏆 **{label}** (`{period}`)")
+        lines.append(f"**{score}** — **{player}** ({tank}) • Tier {ctier} {utils.title_case_type(ctype)} • #{cid} • {created}Z")
+        bests = [
+            r for r in await db.window_tank_bests(window, period)
+            if (tier is None or r[1] == tier) and (ttype is None or r[2] == ttype)
+        ]
+        lines.append("")
+        lines.append(f"**Best per tank** ({len(bests)} tanks played):")
+        for tank_name, _tier, _ttype, sid, bplayer, bscore, _created in bests[:15]:
+            lines.append(f"- **{bscore}** — {bplayer} ({tank_name}) • #{sid}")
+        msg = "\n".join(lines)
+        if len(msg) > 1800:
+            msg = msg[:1800] + "\n…(truncated)"
+        await interaction.response.send_message(msg, ephemeral=True)
+
     @grp.command(name="qualify", description="Check if a score would qualify as a new tank record (no submission)")
     @app_commands.describe(player="Player name (optional)", tank="Tank name", score="Score to compare")
+    @app_commands.autocomplete(tank=choices.tank_names)
     async def qualify(interaction: discord.Interaction, tank: str, score: int, player: str | None = None):
         tank = utils.validate_text('Tank', tank, 64)
         if not (1 <= score <= config.MAX_SCORE):
@@ -90,7 +136,7 @@ async def show(interaction: discord.Interaction, tier: int | None = None, type:
             return
         t = await db.get_tank(tank)
         if not t:
-            await interaction.response.send_message("Unknown tank. Pick an existing tank from the roster.", ephemeral=True)
+            await interaction.response.send_message("Unknown tank. Pick an existing tank from the roster." + choices.did_you_mean(tank), ephemeral=True)
             return
 
         if player is None or not player.strip():
@@ -98,8 +144,10 @@ async def show(interaction: discord.Interaction, tier: int | None = None, type:
         player = utils.validate_text('Player', player, 64)
 
         tier, ttype = t[1], t[2]
+        player_norm = utils.normalize_player(player)
         best = await db.get_best_for_tank(tank)
         champ = await db.get_champion()
+        rank, ranked = await db.rank_for_tank(tank, score, player_norm)
 
         lines = []
         lines.append("**Qualification check**")
@@ -120,6 +168,7 @@ async def show(interaction: discord.Interaction, tier: int | None = None, type:
                     lines.append("❌ Ties do not qualify (earlier wins). You need **+1**.")
                 else:
                     lines.append(f"❌ Short by **{bscore-score}**.")
+        lines.append(f"📈 On this tank you'd be **#{rank} of {ranked}**.")
 
         if champ:
             _, cplayer, ctank, cscore, *_ = champ
@@ -129,50 +178,179 @@ async def show(interaction: discord.Interaction, tier: int | None = None, type:
 
         await interaction.response.send_message("\n".join(lines), ephemeral=True)
 
+    @grp.command(name="rank", description="Show the rank a score would get on a tank and in its tier/type (no submission)")
+    @app_commands.describe(tank="Tank name", score="Score to rank", player="Player name (optional, their own best is left out)")
+    @app_commands.autocomplete(tank=choices.tank_names)
+    async def rank(interaction: discord.Interaction, tank: str, score: int, player: str | None = None):
+        tank = utils.validate_text('Tank', tank, 64)
+        if not (1 <= score <= config.MAX_SCORE):
+            await interaction.response.send_message(f"Score must be between 1 and {config.MAX_SCORE}.", ephemeral=True)
+            return
+        t = await db.get_tank(tank)
+        if not t:
+            await interaction.response.send_message("Unknown tank. Pick an existing tank from the roster." + choices.did_you_mean(tank), ephemeral=True)
+            return
+        player_norm = None
+        if player is not None and player.strip():
+            player = utils.validate_text('Player', player, 64)
+            player_norm = utils.normalize_player(player)
+
+        _, tier, ttype = t
+        tank_rank, tank_ranked = await db.rank_for_tank(tank, score, player_norm)
+        bucket_rank, bucket_ranked = await db.rank_in_bucket(int(tier), str(ttype), score, player_norm)
+
+        lines = []
+        lines.append(f"**Rank check** — **{score}**" + (f" for **{player}**" if player_norm else ""))
+        lines.append(f"- {tank}: **#{tank_rank} of {tank_ranked}** players")
+        lines.append(f"- Tier {tier} {utils.title_case_type(ttype)}: **#{bucket_rank} of {bucket_ranked}** players")
+        lines.append("Ties rank behind the earlier submission.")
+        await interaction.response.send_message("\n".join(lines), ephemeral=True)
+
     @grp.command(name="history", description="Show recent submissions (grouped) + stats")
-    @app_commands.describe(limit="How many recent entries (1-25)")
+    @app_commands.describe(limit="Entries per page (1-25)")
     async def history(interaction: discord.Interaction, limit: int = 10):
         limit = max(1, min(limit, 25))
-        rows = await db.get_recent(limit)
-        if not rows:
-            await interaction.response.send_message("No submissions yet.", ephemeral=True)
-            return
 
-        champ = await db.get_champion()
-        champ_id = champ[0] if champ else None
-
-        grouped: dict[str, dict[int, list[tuple]]] = {}
-        for r in rows:
-            _id, player, tank_name, score, submitted_by, created_at, tier, ttype = r
-            grouped.setdefault(ttype, {}).setdefault(int(tier), []).append(r)
-
-        type_order = ["heavy", "medium", "light", "td"]
-        types_sorted = [t for t in type_order if t in grouped] + [t for t in grouped.keys() if t not in type_order]
-
-        lines: list[str] = []
-        for ttype in types_sorted:
-            lines.append(f"## {utils.title_case_type(ttype)}")
-            for tier in sorted(grouped[ttype].keys(), reverse=True):
-                lines.append(f"**Tier {tier}**")
-                for (_id, player, tank_name, score, submitted_by, created_at, _tier, _ttype) in grouped[ttype][tier]:
-                    badge = "🏆 **TOP** " if champ_id is not None and _id == champ_id else ""
-                    lines.append(f"{badge}**#{_id}** — **{score}** — **{player}** ({tank_name}) • {created_at}Z")
-                lines.append("")
+        async def render(before_id):
+            # Fetch one extra row to know whether there is a next page. Rows,
+            # champion and stats all come from one consistent DB snapshot.
+            rows, champ, tops_tanks, tops_buckets = await db.history_snapshot(limit + 1, before_id=before_id)
+            more = len(rows) > limit
+            rows = rows[:limit]
+            if not rows:
+                return "No submissions yet.", None
+
+            champ_id = champ[0] if champ else None
+
+            grouped: dict[str, dict[int, list[tuple]]] = {}
+            for r in rows:
+                _id, player, tank_name, score, submitted_by, created_at, tier, ttype = r
+                grouped.setdefault(ttype, {}).setdefault(int(tier), []).append(r)
+
+            type_order = ["heavy", "medium", "light", "td"]
+            types_sorted = [t for t in type_order if t in grouped] + [t for t in grouped.keys() if t not in type_order]
+
+            lines: list[str] = []
+            for ttype in types_sorted:
+                lines.append(f"## {utils.title_case_type(ttype)}")
+                for tier in sorted(grouped[ttype].keys(), reverse=True):
+                    lines.append(f"**Tier {tier}**")
+                    for (_id, player, tank_name, score, submitted_by, created_at, _tier, _ttype) in grouped[ttype][tier]:
+                        badge = "🏆 **TOP** " if champ_id is not None and _id == champ_id else ""
+                        lines.append(f"{badge}**#{_id}** — **{score}** — **{player}** ({tank_name}) • {created_at}Z")
+                    lines.append("")
+
+            lines.append("---")
+            lines.append("### 📊 Stats (current #1 holders)")
+            lines.append("**Most #1 tanks:**")
+            for i, (p, cnt) in enumerate(tops_tanks, start=1):
+                lines.append(f"{i}. **{p}** — {cnt} tank tops")
+            lines.append("")
+            lines.append("**Most #1 Tier×Type buckets:**")
+            for i, (p, cnt) in enumerate(tops_buckets, start=1):
+                lines.append(f"{i}. **{p}** — {cnt} bucket tops")
 
-        tops_tanks = await db.top_holders_by_tank(limit=5)
-        tops_buckets = await db.top_holders_by_tier_type(limit=5)
+            msg = "\n".join(lines).strip()
+            if len(msg) > 1800:
+                msg = msg[:1800] + "\n…(truncated)"
+            return msg, (rows[-1][0] if more else None)
 
-        lines.append("---")
-        lines.append("### 📊 Stats (current #1 holders)")
-        lines.append("**Most #1 tanks:**")
-        for i, (p, cnt) in enumerate(tops_tanks, start=1):
-            lines.append(f"{i}. **{p}** — {cnt} tank tops")
+        await paging.send_paged(interaction, render)
+
+    @grp.command(name="player", description="Show a player's personal bests, records and ranks")
+    @app_commands.describe(player="Player name (defaults to you)")
+    async def player(interaction: discord.Interaction, player: str | None = None):
+        if player is None or not player.strip():
+            player = interaction.user.display_name
+        player = utils.validate_text('Player', player, 64)
+
+        prof = await db.player_profile(utils.normalize_player(player))
+        if not prof:
+            await interaction.response.send_message(f"No submissions found for **{player}**.", ephemeral=True)
+            return
+
+        lines = []
+        lines.append(f"## 👤 {prof['name']}")
+        lines.append(f"Submissions: **{prof['submissions']}** • Tanks played: **{len(prof['bests'])}** • Records held: **{len(prof['records'])}**")
         lines.append("")
-        lines.append("**Most #1 Tier×Type buckets:**")
-        for i, (p, cnt) in enumerate(tops_buckets, start=1):
-            lines.append(f"{i}. **{p}** — {cnt} bucket tops")
+
+        lines.append("**Tier×Type buckets:**")
+        for tier, ttype, tank_name, score, rank in prof["buckets"]:
+            badge = "🏆 " if rank == 1 else ""
+            lines.append(f"{badge}Tier {tier} {utils.title_case_type(ttype)} — **#{rank}** with **{score}** ({tank_name})")
+        lines.append("")
+
+        lines.append("**Personal bests:**")
+        for tank_name, tier, ttype, sid, score, created_at, rank in prof["bests"]:
+            badge = "🏆 " if rank == 1 else ""
+            lines.append(f"{badge}**{score}** — {tank_name} (T{tier} {utils.title_case_type(ttype)}) • rank #{rank} • #{sid} • {created_at}Z")
 
         msg = "\n".join(lines).strip()
         if len(msg) > 1800:
             msg = msg[:1800] + "\n…(truncated)"
         await interaction.response.send_message(msg, ephemeral=True)
+
+    @grp.command(name="import_csv", description="Bulk import historical submissions from CSV (admins only)")
+    @app_commands.describe(csv_file="CSV with header player,tank,score[,created_at]")
+    async def import_csv(interaction: discord.Interaction, csv_file: discord.Attachment):
+        member = interaction.user
+        if not isinstance(member, discord.Member) or not utils.can_manage(member):
+            await interaction.response.send_message("Nope. You need **Manage Server**.", ephemeral=True)
+            return
+        await interaction.response.send_message("Importing submissions…", ephemeral=True)
+
+        started = time.perf_counter()
+        raw = (await csv_file.read()).decode("utf-8", errors="replace")
+        roster = {n: (int(tr), tp) for n, tr, tp in await db.list_tanks()}
+        submitted_by = interaction.user.display_name
+        now = utils.utc_now_z()
+
+        # Validate everything first; nothing is written if any row is bad.
+        rows = []
+        errors = []
+        for line_no, row in enumerate(csv.DictReader(io.StringIO(raw)), start=2):
+            try:
+                player_raw = utils.validate_text('Player', row.get("player") or "", 64)
+                tank = utils.validate_text('Tank', row.get("tank") or "", 64)
+                if tank not in roster:
+                    raise ValueError(f"Unknown tank `{tank}`.")
+                score = int((row.get("score") or "").strip())
+                if not (1 <= score <= config.MAX_SCORE):
+                    raise ValueError(f"Score must be between 1 and {config.MAX_SCORE}.")
+                created = (row.get("created_at") or "").strip()
+                created = utils.normalize_timestamp(created) if created else now
+            except ValueError as e:
+                errors.append(f"line {line_no}: {e}")
+                continue
+            rows.append((player_raw, utils.normalize_player(player_raw), tank, score, submitted_by, created))
+
+        if errors:
+            lines = [f"❌ Import aborted: {len(errors)} invalid row(s), nothing stored."]
+            lines += [f"- {e}" for e in errors[:15]]
+            if len(errors) > 15:
+                lines.append(f"…and {len(errors) - 15} more")
+            await interaction.followup.send("\n".join(lines)[:1900], ephemeral=True)
+            return
+        if not rows:
+            await interaction.followup.send("❌ No rows found in CSV.", ephemeral=True)
+            return
+
+        try:
+            inserted = await db.bulk_insert_submissions(rows)
+        except Exception as e:
+            log.error(f"CSV import of {len(rows)} submissions failed: {type(e).__name__}: {e}")
+            await interaction.followup.send("❌ Could not store submissions, nothing was imported.", ephemeral=True)
+            return
+        elapsed = time.perf_counter() - started
+
+        # Refresh each affected bucket once, in the background
+        affected = sorted({roster[r[2]] for r in rows})
+        for tier, ttype in affected:
+            forum_index.schedule_update(bot, tier, ttype)
+
+        rate = inserted / elapsed if elapsed > 0 else float(inserted)
+        await interaction.followup.send(
+            f"✅ Imported **{inserted}** submissions in {elapsed:.2f}s ({rate:,.0f} rows/s). "
+            f"Queued refresh of {len(affected)} forum bucket(s).",
+            ephemeral=True,
+        )
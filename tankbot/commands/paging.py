@@ -0,0 +1,57 @@
+import discord
+from typing import Awaitable, Callable
+
+# Page renderer: takes the cursor of the page to show (None = first page) and
+# returns (message, cursor of the next page or None when this is the last one).
+PageFn = Callable[[object], Awaitable[tuple[str, object]]]
+
+class Pager(discord.ui.View):
+    """Prev/Next buttons over a keyset-paginated listing.
+
+    Only cursors are kept (a stack of page starts), so going back re-runs the
+    same cheap keyset query instead of holding every page in memory."""
+
+    def __init__(self, owner_id: int, render: PageFn, timeout: float = 300):
+        super().__init__(timeout=timeout)
+        self.owner_id = owner_id
+        self.render = render
+        self.starts: list[object] = [None]
+        self.next_cursor: object = None
+
+    async def first_page(self) -> str:
+        msg, self.next_cursor = await self.render(None)
+        self._sync_buttons()
+        return msg
+
+    def _sync_buttons(self):
+        self.prev_btn.disabled = len(self.starts) <= 1
+        self.next_btn.disabled = self.next_cursor is None
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return interaction.user.id == self.owner_id
+
+    async def _show(self, interaction: discord.Interaction):
+        msg, self.next_cursor = await self.render(self.starts[-1])
+        self._sync_buttons()
+        await interaction.response.edit_message(content=msg, view=self)
+
+    @discord.ui.button(label="◀ Prev", style=discord.ButtonStyle.secondary)
+    async def prev_btn(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if len(self.starts) > 1:
+            self.starts.pop()
+        await self._show(interaction)
+
+    @discord.ui.button(label="Next ▶", style=discord.ButtonStyle.secondary)
+    async def next_btn(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if self.next_cursor is not None:
+            self.starts.append(self.next_cursor)
+        await self._show(interaction)
+
+async def send_paged(interaction: discord.Interaction, render: PageFn):
+    """Send the first page ephemerally, with buttons only if there is more than one page."""
+    pager = Pager(interaction.user.id, render)
+    msg = await pager.first_page()
+    if pager.next_cursor is None:
+        await interaction.response.send_message(msg, ephemeral=True)
+    else:
+        await interaction.response.send_message(msg, ephemeral=True, view=pager)
@@ -1,9 +1,17 @@
 import io
 import csv
+import time
+import logging
 import discord
 from discord import app_commands
 
 from .. import config, db, forum_index, utils
+from . import choices, paging
+
+log = logging.getLogger(__name__)
+
+# Tanks per /tank list page; keeps a page well under Discord's message limit.
+_PAGE_SIZE = 20
 
 class Tank(app_commands.Group):
     def __init__(self):
@@ -13,74 +21,138 @@ def _require_admin(interaction: discord.Interaction) -> bool:
     m = interaction.user
     return isinstance(m, discord.Member) and utils.can_manage(m)
 
+def _progress_reporter(interaction: discord.Interaction, label: str, every: float = 2.0):
+    """forum_index progress callback that edits the command's reply, at most every `every` seconds."""
+    last = 0.0
+
+    async def report(done: int, total: int, changed: int, skipped: int, failed: int):
+        nonlocal last
+        now = time.monotonic()
+        if done < total and now - last < every:
+            return
+        last = now
+        try:
+            await interaction.edit_original_response(
+                content=f"{label} {done}/{total} buckets ({changed} changed, {skipped} skipped, {failed} failed)"
+            )
+        except discord.HTTPException:
+            pass
+
+    return report
+
+async def _roster_diff(csv_file: discord.Attachment, delete_missing: bool):
+    """Parse a roster CSV and diff it against the DB.
+    Returns (incoming, existing, adds, edits, removes); raises ValueError on a bad row."""
+    raw = (await csv_file.read()).decode("utf-8", errors="replace")
+    r = csv.DictReader(io.StringIO(raw))
+    incoming = {}
+    for row in r:
+        name = utils.validate_text('Tank name', (row.get('name') or ''), 64) if (row.get('name') or '').strip() else ''
+        if not name:
+            continue
+        try:
+            tier = int(row.get("tier") or 0)
+        except ValueError:
+            tier = 0
+        ttype = (row.get("type") or "").strip().lower()
+        if not (1 <= tier <= 10) or ttype not in ("light","medium","heavy","td"):
+            raise ValueError(f"Invalid row for `{name}`.")
+        incoming[name] = (tier, ttype)
+
+    existing = {n: (int(t), tp) for n, t, tp in await db.list_tanks()}
+
+    adds = [n for n in incoming.keys() if n not in existing]
+    edits = [n for n in incoming.keys() if n in existing and incoming[n] != existing[n]]
+    removes = [n for n in existing.keys() if n not in incoming] if delete_missing else []
+    return incoming, existing, adds, edits, removes
+
 def register(tree: app_commands.CommandTree, bot: discord.Client, guild: discord.Object | None):
     grp = Tank()
     tree.add_command(grp, guild=guild)
 
     @grp.command(name="add", description="Add a tank (admins only)")
     async def add(interaction: discord.Interaction, name: str, tier: int, type: str):
+        await interaction.response.defer(ephemeral=True, thinking=True)
         if not _require_admin(interaction):
-            await interaction.response.send_message("Nope. You need **Manage Server**.", ephemeral=True)
+            await interaction.followup.send("Nope. You need **Manage Server**.", ephemeral=True)
             return
         name = utils.validate_text('Tank name', name, 64)
         type = type.strip().lower()
         if not (1 <= tier <= 10):
-            await interaction.response.send_message("Tier must be 1..10.", ephemeral=True)
+            await interaction.followup.send("Tier must be 1..10.", ephemeral=True)
             return
         if type not in ("light", "medium", "heavy", "td"):
-            await interaction.response.send_message("Type must be one of: light, medium, heavy, td.", ephemeral=True)
+            await interaction.followup.send("Type must be one of: light, medium, heavy, td.", ephemeral=True)
             return
         if await db.get_tank(name):
-            await interaction.response.send_message("Tank already exists.", ephemeral=True)
+            await interaction.followup.send("Tank already exists.", ephemeral=True)
             return
 
-        await db.add_tank(name, tier, type, interaction.user.display_name, utils.utc_now_z())
-        await forum_index.targeted_update(bot, tier, type)
-        await interaction.response.send_message(f"✅ Added **{name}** (Tier {tier}, {utils.title_case_type(type)}).", ephemeral=True)
+        try:
+            await db.add_tank(name, tier, type, interaction.user.display_name, utils.utc_now_z())
+        except Exception as e:
+            log.error(f"Adding tank {name} failed: {e.__class__.__name__}: {e}")
+            await interaction.followup.send("❌ Could not add tank, please try again.", ephemeral=True)
+            return
+        forum_index.schedule_update(bot, tier, type)
+        await interaction.followup.send(f"✅ Added **{name}** (Tier {tier}, {utils.title_case_type(type)}).", ephemeral=True)
 
     @grp.command(name="edit", description="Edit a tank (admins only)")
+    @app_commands.autocomplete(name=choices.tank_names)
     async def edit(interaction: discord.Interaction, name: str, tier: int, type: str):
+        await interaction.response.defer(ephemeral=True, thinking=True)
         if not _require_admin(interaction):
-            await interaction.response.send_message("Nope. You need **Manage Server**.", ephemeral=True)
+            await interaction.followup.send("Nope. You need **Manage Server**.", ephemeral=True)
             return
         name = utils.validate_text('Tank name', name, 64)
         type = type.strip().lower()
         t = await db.get_tank(name)
         if not t:
-            await interaction.response.send_message("Tank not found.", ephemeral=True)
+            await interaction.followup.send("Tank not found." + choices.did_you_mean(name), ephemeral=True)
             return
         old_tier, old_type = int(t[1]), t[2]
         if not (1 <= tier <= 10):
-            await interaction.response.send_message("Tier must be 1..10.", ephemeral=True)
+            await interaction.followup.send("Tier must be 1..10.", ephemeral=True)
             return
         if type not in ("light", "medium", "heavy", "td"):
-            await interaction.response.send_message("Type must be one of: light, medium, heavy, td.", ephemeral=True)
+            await interaction.followup.send("Type must be one of: light, medium, heavy, td.", ephemeral=True)
             return
 
-        await db.edit_tank(name, tier, type, interaction.user.display_name, utils.utc_now_z())
+        try:
+            await db.edit_tank(name, tier, type, interaction.user.display_name, utils.utc_now_z())
+        except Exception as e:
+            log.error(f"Editing tank {name} failed: {e.__class__.__name__}: {e}")
+            await interaction.followup.send("❌ Could not update tank, please try again.", ephemeral=True)
+            return
         # Update both old and new buckets
-        await forum_index.targeted_update(bot, old_tier, old_type)
-        await forum_index.targeted_update(bot, tier, type)
-        await interaction.response.send_message(f"✅ Updated **{name}**.", ephemeral=True)
+        forum_index.schedule_update(bot, old_tier, old_type)
+        forum_index.schedule_update(bot, tier, type)
+        await interaction.followup.send(f"✅ Updated **{name}**.", ephemeral=True)
 
     @grp.command(name="remove", description="Remove a tank (only if no submissions)")
+    @app_commands.autocomplete(name=choices.tank_names)
     async def remove(interaction: discord.Interaction, name: str):
+        await interaction.response.defer(ephemeral=True, thinking=True)
         if not _require_admin(interaction):
-            await interaction.response.send_message("Nope. You need **Manage Server**.", ephemeral=True)
+            await interaction.followup.send("Nope. You need **Manage Server**.", ephemeral=True)
             return
         name = utils.validate_text('Tank name', name, 64)
         t = await db.get_tank(name)
         if not t:
-            await interaction.response.send_message("Tank not found.", ephemeral=True)
+            await interaction.followup.send("Tank not found." + choices.did_you_mean(name), ephemeral=True)
             return
         tier, ttype = int(t[1]), t[2]
         try:
             await db.remove_tank(name, interaction.user.display_name, utils.utc_now_z())
+        except ValueError as e:
+            await interaction.followup.send(f"❌ {e}", ephemeral=True)
+            return
         except Exception as e:
-            await interaction.response.send_message(f"❌ {type(e).__name__}: {e}", ephemeral=True)
+            log.error(f"Removing tank {name} failed: {type(e).__name__}: {e}")
+            await interaction.followup.send("❌ Could not remove tank, please try again.", ephemeral=True)
             return
-        await forum_index.targeted_update(bot, tier, ttype)
-        await interaction.response.send_message(f"✅ Removed **{name}**.", ephemeral=True)
+        forum_index.schedule_update(bot, tier, ttype)
+        await interaction.followup.send(f"✅ Removed **{name}**.", ephemeral=True)
 
     @grp.command(name="list", description="List tanks (filters optional)")
     async def list_cmd(interaction: discord.Interaction, tier: int | None = None, type: str | None = None):
@@ -89,34 +161,46 @@ def register(tree: app_commands.CommandTree, bot: discord.Client, guild: discord
             return
         if type is not None:
             type = type.strip().lower()
-        rows = await db.list_tanks(tier=tier, ttype=type)
-        if not rows:
-            await interaction.response.send_message("No tanks found.", ephemeral=True)
-            return
-        lines = ["**Tanks**"]
-        for n, tr, tp in rows[:200]:
-            lines.append(f"- **{n}** — Tier {tr}, {utils.title_case_type(tp)}")
-        msg = "\n".join(lines)
-        if len(msg) > 1800:
-            msg = msg[:1800] + "\n…(truncated)"
-        await interaction.response.send_message(msg, ephemeral=True)
+
+        async def render(after):
+            rows = await db.list_tanks_page(_PAGE_SIZE + 1, after=after, tier=tier, ttype=type)
+            more = len(rows) > _PAGE_SIZE
+            rows = rows[:_PAGE_SIZE]
+            if not rows:
+                return "No tanks found.", None
+            lines = ["**Tanks**"]
+            for n, tr, tp in rows:
+                lines.append(f"- **{n}** — Tier {tr}, {utils.title_case_type(tp)}")
+            msg = "\n".join(lines)
+            if len(msg) > 1800:
+                msg = msg[:1800] + "\n…(truncated)"
+            return msg, (tuple(rows[-1]) if more else None)
+
+        await paging.send_paged(interaction, render)
 
     @grp.command(name="changes", description="Show tank change log")
+    @app_commands.describe(limit="Entries per page (1-25)")
     async def changes(interaction: discord.Interaction, limit: int = 20):
         if not _require_admin(interaction):
             await interaction.response.send_message("Nope. You need **Manage Server**.", ephemeral=True)
             return
-        rows = await db.tank_changes(limit=limit)
-        if not rows:
-            await interaction.response.send_message("No changes logged.", ephemeral=True)
-            return
-        lines = ["**Tank changes**"]
-        for _id, action, details, actor, created in rows:
-            lines.append(f"- #{_id} **{action}** `{details}` by **{actor}** • {created}Z")
-        msg = "\n".join(lines)
-        if len(msg) > 1800:
-            msg = msg[:1800] + "\n…(truncated)"
-        await interaction.response.send_message(msg, ephemeral=True)
+        limit = max(1, min(limit, 25))
+
+        async def render(before_id):
+            rows = await db.tank_changes(limit=limit + 1, before_id=before_id)
+            more = len(rows) > limit
+            rows = rows[:limit]
+            if not rows:
+                return "No changes logged.", None
+            lines = ["**Tank changes**"]
+            for _id, action, details, actor, created in rows:
+                lines.append(f"- #{_id} **{action}** `{details}` by **{actor}** • {created}Z")
+            msg = "\n".join(lines)
+            if len(msg) > 1800:
+                msg = msg[:1800] + "\n…(truncated)"
+            return msg, (rows[-1][0] if more else None)
+
+        await paging.send_paged(interaction, render)
 
     @grp.command(name="export_csv", description="Export tank roster as CSV")
     async def export_csv(interaction: discord.Interaction):
@@ -137,20 +221,11 @@ def register(tree: app_commands.CommandTree, bot: discord.Client, guild: discord
         if not _require_admin(interaction):
             await interaction.response.send_message("Nope. You need **Manage Server**.", ephemeral=True)
             return
-        raw = (await csv_file.read()).decode("utf-8", errors="replace")
-        r = csv.DictReader(io.StringIO(raw))
-        incoming = {}
-        for row in r:
-            name = utils.validate_text('Tank name', (row.get('name') or ''), 64) if (row.get('name') or '').strip() else ''
-            if not name:
-                continue
-            incoming[name] = (int(row.get("tier") or 0), (row.get("type") or "").strip().lower())
-
-        existing = {n: (int(t), tp) for n, t, tp in await db.list_tanks()}
-
-        adds = [n for n in incoming.keys() if n not in existing]
-        edits = [n for n in incoming.keys() if n in existing and incoming[n] != existing[n]]
-        removes = [n for n in existing.keys() if n not in incoming] if delete_missing else []
+        try:
+            incoming, existing, adds, edits, removes = await _roster_diff(csv_file, delete_missing)
+        except ValueError as e:
+            await interaction.response.send_message(f"❌ {e}", ephemeral=True)
+            return
 
         lines = ["**Preview import**"]
         lines.append(f"- Adds: {len(adds)}")
@@ -166,69 +241,59 @@ def register(tree: app_commands.CommandTree, bot: discord.Client, guild: discord
 
     @grp.command(name="import_csv", description="Import tank roster from CSV (applies changes)")
     async def import_csv(interaction: discord.Interaction, csv_file: discord.Attachment, delete_missing: bool = False):
+        await interaction.response.defer(ephemeral=True, thinking=True)
         if not _require_admin(interaction):
-            await interaction.response.send_message("Nope. You need **Manage Server**.", ephemeral=True)
+            await interaction.followup.send("Nope. You need **Manage Server**.", ephemeral=True)
+            return
+        try:
+            incoming, existing, adds, edits, removes = await _roster_diff(csv_file, delete_missing)
+        except ValueError as e:
+            await interaction.followup.send(f"❌ {e}", ephemeral=True)
+            return
+
+        # Apply the whole diff (and its audit rows) atomically; tanks with submissions are skipped.
+        try:
+            removed, skipped = await db.apply_roster_diff(
+                [(n, *incoming[n]) for n in adds],
+                [(n, *incoming[n]) for n in edits],
+                removes,
+                interaction.user.display_name,
+                utils.utc_now_z(),
+            )
+        except Exception as e:
+            log.error(f"Roster import failed: {type(e).__name__}: {e}")
+            await interaction.followup.send("❌ Could not apply roster import, nothing was changed.", ephemeral=True)
             return
-        raw = (await csv_file.read()).decode("utf-8", errors="replace")
-        r = csv.DictReader(io.StringIO(raw))
-        incoming = {}
-        for row in r:
-            name = utils.validate_text('Tank name', (row.get('name') or ''), 64) if (row.get('name') or '').strip() else ''
-            if not name:
-                continue
-            tier = int(row.get("tier") or 0)
-            ttype = (row.get("type") or "").strip().lower()
-            if not (1 <= tier <= 10) or ttype not in ("light","medium","heavy","td"):
-                await interaction.response.send_message(f"Invalid row for `{name}`.", ephemeral=True)
-                return
-            incoming[name] = (tier, ttype)
-
-        existing_rows = await db.list_tanks()
-        existing = {n: (int(t), tp) for n, t, tp in existing_rows}
-
-        adds = [n for n in incoming.keys() if n not in existing]
-        edits = [n for n in incoming.keys() if n in existing and incoming[n] != existing[n]]
-        removes = [n for n in existing.keys() if n not in incoming] if delete_missing else []
-
-        # Apply adds/edits
-        for n in adds:
-            tier, tp = incoming[n]
-            await db.add_tank(n, tier, tp, interaction.user.display_name, utils.utc_now_z())
-        for n in edits:
-            tier, tp = incoming[n]
-            await db.edit_tank(n, tier, tp, interaction.user.display_name, utils.utc_now_z())
-
-        # Apply removals if allowed
-        if delete_missing:
-            for n in removes:
-                try:
-                    await db.remove_tank(n, interaction.user.display_name, utils.utc_now_z())
-                except Exception:
-                    # skip tanks with submissions
-                    pass
 
         # Targeted updates: rebuild buckets for affected tiers/types (cheap + safe)
         affected = set()
         for n in adds + edits:
-            tier, tp = incoming[n]
-            affected.add((tier, tp))
-        for n in edits:
-            old_tier, old_tp = existing[n]
-            affected.add((old_tier, old_tp))
+            affected.add(incoming[n])
+        for n in edits + removed:
+            affected.add(existing[n])
 
         for tier, tp in affected:
-            await forum_index.targeted_update(bot, tier, tp)
+            forum_index.schedule_update(bot, tier, tp)
 
-        await interaction.response.send_message(f"✅ Import applied. Adds={len(adds)} Edits={len(edits)} Removes={len(removes)}.", ephemeral=True)
+        msg = f"✅ Import applied. Adds={len(adds)} Edits={len(edits)} Removes={len(removed)}."
+        if skipped:
+            msg += f" Skipped {len(skipped)} removal(s) with submissions."
+        await interaction.followup.send(msg, ephemeral=True)
 
     @grp.command(name="rebuild_index", description="Rebuild ALL forum index threads")
-    async def rebuild_index(interaction: discord.Interaction):
+    @app_commands.describe(force="Edit every thread, even ones whose content hasn't changed")
+    async def rebuild_index(interaction: discord.Interaction, force: bool = False):
         if not _require_admin(interaction):
             await interaction.response.send_message("Nope. You need **Manage Server**.", ephemeral=True)
             return
         await interaction.response.send_message("Rebuilding index…", ephemeral=True)
-        await forum_index.rebuild_all(bot)
-        await interaction.followup.send("✅ Index rebuilt.", ephemeral=True)
+        changed, skipped, failed = await forum_index.rebuild_all(
+            bot, force=force, progress=_progress_reporter(interaction, "Rebuilding index…")
+        )
+        msg = f"✅ Index rebuilt: {changed} buckets changed / {skipped} skipped."
+        if failed:
+            msg += f" ❌ {failed} failed (retried automatically after a restart, or run this again)."
+        await interaction.followup.send(msg, ephemeral=True)
 
     @grp.command(name="rebuild_index_missing", description="Create/repair missing forum index threads")
     async def rebuild_index_missing(interaction: discord.Interaction):
@@ -236,5 +301,5 @@ def register(tree: app_commands.CommandTree, bot: discord.Client, guild: discord
             await interaction.response.send_message("Nope. You need **Manage Server**.", ephemeral=True)
             return
         await interaction.response.send_message("Repairing missing index threads…", ephemeral=True)
-        await forum_index.rebuild_missing(bot)
-        await interaction.followup.send("✅ Missing threads repaired.", ephemeral=True)
+        created = await forum_index.rebuild_missing(bot, progress=_progress_reporter(interaction, "Repairing missing index threads…"))
+        await interaction.followup.send(f"✅ Missing threads repaired: {created} created.", ephemeral=True)
@@ -13,6 +13,30 @@ COMMANDER_ROLE_NAME = os.getenv("COMMANDER_ROLE_NAME", "Clan Commander")
 MAX_SCORE = int(os.getenv("MAX_SCORE", "100000"))
 
 DB_PATH = os.getenv("DB_PATH", "highscores.db")
+HISTORY_DB_PATH = os.getenv("HISTORY_DB_PATH", os.path.join(os.path.dirname(DB_PATH), "history.db"))
+DB_READERS = int(os.getenv("DB_READERS", "4"))        # pooled read-only connections
+DB_CACHE_MB = int(os.getenv("DB_CACHE_MB", "16"))     # page cache per connection
+DB_MMAP_MB = int(os.getenv("DB_MMAP_MB", "64"))       # memory-mapped I/O window
+DB_STATS_ENABLED = os.getenv("DB_STATS_ENABLED", "1") in ("1", "true", "True", "yes", "YES")  # per-query timings
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "200"))  # log queries slower than this
+
+# Group commit for /highscore submit bursts
+SUBMIT_BATCH_SIZE = int(os.getenv("SUBMIT_BATCH_SIZE", "50"))        # max submissions per transaction
+SUBMIT_BATCH_DELAY_MS = int(os.getenv("SUBMIT_BATCH_DELAY_MS", "20"))  # max wait to fill a batch
+
+# Background forum index updates
+FORUM_UPDATE_DEBOUNCE_MS = int(os.getenv("FORUM_UPDATE_DEBOUNCE_MS", "1500"))  # coalesce window per bucket
+FORUM_UPDATE_CONCURRENCY = int(os.getenv("FORUM_UPDATE_CONCURRENCY", "2"))     # buckets updated at once
+FORUM_REBUILD_CONCURRENCY = int(os.getenv("FORUM_REBUILD_CONCURRENCY", "4"))   # workers for /tank rebuild_index
+FORUM_UPDATE_RETRIES = int(os.getenv("FORUM_UPDATE_RETRIES", "3"))             # re-tries of a failed bucket update
+
+# Background jobs (record announcements)
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+
+# Archive of old submissions (moved to HISTORY_DB_PATH)
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "180"))    # 0 disables archiving
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))    # rows per archive transaction
+ARCHIVE_INTERVAL_HOURS = int(os.getenv("ARCHIVE_INTERVAL_HOURS", "24"))
 
 # Backups
 BACKUP_CHANNEL_ID = int(os.getenv("BACKUP_CHANNEL_ID", "0"))
@@ -1,6 +1,18 @@
+import asyncio
+import datetime as dt
+import functools
+import logging
+import re
+import time
+from contextlib import asynccontextmanager
+
 import aiosqlite
-from . import config
+from . import config, leaderboard, querystats
+from .utils import utc_now_z, normalize_player
+
+log = logging.getLogger(__name__)
 
+# Base (version 0) schema. Everything after it lives in MIGRATIONS.
 SCHEMA = """
 CREATE TABLE IF NOT EXISTS tanks (
     name TEXT PRIMARY KEY,
@@ -36,17 +48,644 @@ CREATE TABLE IF NOT EXISTS tank_index_posts (
 );
 """
 
+# tank_records holds the current best submission per tank (highest score,
+# earliest id wins ties). It is maintained by insert_submission in the same
+# transaction and can be recomputed with rebuild_tank_records().
+_SQL_FILL_TANK_RECORDS = """
+INSERT INTO tank_records (tank_id, submission_id, player_id, score)
+SELECT tank_id, id, player_id, score
+FROM (
+    SELECT s.*, ROW_NUMBER() OVER (PARTITION BY s.tank_id ORDER BY s.score DESC, s.id ASC) AS rn
+    FROM submissions s
+)
+WHERE rn = 1;
+"""
+
+_SQL_UPSERT_TANK_RECORD = """
+INSERT INTO tank_records (tank_id, submission_id, player_id, score)
+VALUES (?,?,?,?)
+ON CONFLICT (tank_id) DO UPDATE SET
+    submission_id = excluded.submission_id,
+    player_id = excluded.player_id,
+    score = excluded.score
+WHERE excluded.score > tank_records.score;
+"""
+
+# ---- windowed leaderboards ----
+# window_bests holds the best submission per tank within each week, month and
+# season (same tie rule as tank_records), so a window's champion and per-tank
+# bests are an index range on (kind, period). Rows are denormalized
+# (created_at, submitted_by) so archiving the submission doesn't affect them.
+# _insert_rows upserts every new row into each kind; rebuild_window_bests()
+# refills periods from a start time through idx_submissions_created.
+WINDOWS = ("week", "month", "season")
+
+# Period key of a created_at value ({c}); keys sort chronologically. Weeks
+# start on Monday (key = that date); a season is a calendar quarter. Rows
+# whose timestamp doesn't parse get a NULL key and are left out.
+_WINDOW_PERIOD_SQL = {
+    "week": "date(substr({c}, 1, 10), '-6 days', 'weekday 1')",
+    "month": "substr({c}, 1, 7)",
+    "season": "substr({c}, 1, 4) || '-Q' || ((CAST(substr({c}, 6, 2) AS INTEGER) + 2) / 3)",
+}
+
+def window_period(kind: str, ts: str | None = None) -> str:
+    """Period key of timestamp ts (default: now) for a window kind; matches _WINDOW_PERIOD_SQL."""
+    d = dt.date.fromisoformat((ts or utc_now_z())[:10])
+    if kind == "week":
+        return (d - dt.timedelta(days=d.weekday())).isoformat()
+    if kind == "month":
+        return d.isoformat()[:7]
+    if kind == "season":
+        return f"{d.year}-Q{(d.month + 2) // 3}"
+    raise ValueError(f"Unknown window: {kind}")
+
+def _period_start(kind: str, period: str) -> str:
+    if kind == "week":
+        day = period
+    elif kind == "month":
+        day = f"{period}-01"
+    else:
+        year, q = period.split("-Q")
+        day = f"{year}-{3 * (int(q) - 1) + 1:02d}-01"
+    return f"{day}T00:00:00Z"
+
+_WINDOW_BESTS_COLUMNS = "(kind, period, tank_id, submission_id, player_id, score, submitted_by_id, created_at)"
+
+# New rows of one insert batch (id > ?), applied in id order.
+_SQL_UPSERT_WINDOW_BESTS = {
+    kind: f"""
+INSERT INTO window_bests {_WINDOW_BESTS_COLUMNS}
+SELECT '{kind}', {expr.format(c="s.created_at")}, s.tank_id, s.id, s.player_id, s.score, s.submitted_by_id, s.created_at
+FROM submissions s
+WHERE s.id > ? AND {expr.format(c="s.created_at")} IS NOT NULL
+ORDER BY s.id
+ON CONFLICT (kind, period, tank_id) DO UPDATE SET
+    submission_id = excluded.submission_id,
+    player_id = excluded.player_id,
+    score = excluded.score,
+    submitted_by_id = excluded.submitted_by_id,
+    created_at = excluded.created_at
+WHERE excluded.score > window_bests.score;
+"""
+    for kind, expr in _WINDOW_PERIOD_SQL.items()
+}
+
+# Every period from a start time on (created_at >= ?), archived rows included.
+_SQL_FILL_WINDOW_BESTS = {
+    kind: f"""
+INSERT INTO window_bests {_WINDOW_BESTS_COLUMNS}
+SELECT '{kind}', period, tank_id, id, player_id, score, submitted_by_id, created_at
+FROM (
+    SELECT s.id, s.tank_id, s.player_id, s.score, s.submitted_by_id, s.created_at,
+           {expr.format(c="s.created_at")} AS period,
+           ROW_NUMBER() OVER (
+               PARTITION BY {expr.format(c="s.created_at")}, s.tank_id ORDER BY s.score DESC, s.id ASC
+           ) AS rn
+    FROM (SELECT * FROM all_submissions WHERE created_at >= ?) s
+)
+WHERE rn = 1 AND period IS NOT NULL;
+"""
+    for kind, expr in _WINDOW_PERIOD_SQL.items()
+}
+
+async def _fill_window_bests(db, since: str | None) -> int:
+    # Inside the caller's write transaction. since=None refills everything.
+    filled = 0
+    for kind in WINDOWS:
+        if since is None:
+            start = ""
+            await db.execute("DELETE FROM window_bests WHERE kind = ?", (kind,))
+        else:
+            period = window_period(kind, since)
+            start = _period_start(kind, period)
+            await db.execute("DELETE FROM window_bests WHERE kind = ? AND period >= ?", (kind, period))
+        cur = await db.execute(_SQL_FILL_WINDOW_BESTS[kind], (start,))
+        filled += max(cur.rowcount, 0)
+    return filled
+
+async def _migrate_window_bests(db):
+    # Version 7: window_bests rollups plus a created_at index, backfilled
+    # from every submission (main and history).
+    for stmt in (
+        """
+        CREATE TABLE IF NOT EXISTS window_bests (
+            kind TEXT NOT NULL,
+            period TEXT NOT NULL,
+            tank_id INTEGER NOT NULL,
+            submission_id INTEGER NOT NULL,
+            player_id INTEGER NOT NULL,
+            score INTEGER NOT NULL,
+            submitted_by_id INTEGER NOT NULL,
+            created_at TEXT NOT NULL,
+            PRIMARY KEY (kind, period, tank_id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_window_bests_score ON window_bests (kind, period, score DESC, submission_id)",
+        "CREATE INDEX IF NOT EXISTS idx_submissions_created ON submissions (created_at)",
+        # Earlier migrations are done, so the view can exist on the writer now.
+        ALL_SUBMISSIONS_VIEW,
+    ):
+        await db.execute(stmt)
+    await _fill_window_bests(db, None)
+
+async def _migrate_surrogate_keys(db):
+    # Version 3: players table + integer tank ids; submissions and tank_records
+    # hold integer keys instead of repeated names.
+    cur = await db.execute("SELECT DISTINCT tank_name FROM submissions WHERE tank_name NOT IN (SELECT name FROM tanks)")
+    orphans = [r[0] for r in await cur.fetchall()]
+    if orphans:
+        raise RuntimeError(f"Submissions reference tanks missing from the roster: {orphans[:10]}. Re-add them before upgrading.")
+    row = await (await db.execute("SELECT seq FROM sqlite_sequence WHERE name = 'submissions'")).fetchone()
+    old_seq = int(row[0]) if row else 0
+
+    await db.execute("""
+    CREATE TABLE players (
+        id INTEGER PRIMARY KEY,
+        name_raw TEXT NOT NULL UNIQUE,
+        name_norm TEXT NOT NULL
+    )""")
+    names = {}
+    for raw, norm in await (await db.execute("SELECT DISTINCT player_name_raw, player_name_norm FROM submissions")).fetchall():
+        names.setdefault(raw, norm)
+    for (raw,) in await (await db.execute("SELECT DISTINCT submitted_by FROM submissions")).fetchall():
+        names.setdefault(raw, normalize_player(raw))
+    await db.executemany("INSERT INTO players (name_raw, name_norm) VALUES (?,?)", list(names.items()))
+
+    await db.execute("""
+    CREATE TABLE tanks_new (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE,
+        tier INTEGER NOT NULL,
+        type TEXT NOT NULL,
+        created_at TEXT NOT NULL
+    )""")
+    await db.execute("INSERT INTO tanks_new (name, tier, type, created_at) SELECT name, tier, type, created_at FROM tanks ORDER BY rowid")
+
+    await db.execute("""
+    CREATE TABLE submissions_new (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        player_id INTEGER NOT NULL,
+        tank_id INTEGER NOT NULL,
+        score INTEGER NOT NULL,
+        submitted_by_id INTEGER NOT NULL,
+        created_at TEXT NOT NULL
+    )""")
+    await db.execute("""
+    INSERT INTO submissions_new (id, player_id, tank_id, score, submitted_by_id, created_at)
+    SELECT s.id, p.id, t.id, s.score, b.id, s.created_at
+    FROM submissions s
+    JOIN players p ON p.name_raw = s.player_name_raw
+    JOIN players b ON b.name_raw = s.submitted_by
+    JOIN tanks_new t ON t.name = s.tank_name
+    ORDER BY s.id
+    """)
+
+    await db.execute("DROP TABLE tank_records")
+    await db.execute("DROP TABLE submissions")
+    await db.execute("DROP TABLE tanks")
+    await db.execute("ALTER TABLE tanks_new RENAME TO tanks")
+    await db.execute("ALTER TABLE submissions_new RENAME TO submissions")
+    # Never hand out an id that was used before the rebuild.
+    await db.execute("DELETE FROM sqlite_sequence WHERE name = 'submissions'")
+    await db.execute(
+        "INSERT INTO sqlite_sequence (name, seq) VALUES ('submissions', MAX(?, (SELECT COALESCE(MAX(id), 0) FROM submissions)))",
+        (old_seq,),
+    )
+
+    await db.execute("""
+    CREATE TABLE tank_records (
+        tank_id INTEGER PRIMARY KEY,
+        submission_id INTEGER NOT NULL,
+        player_id INTEGER NOT NULL,
+        score INTEGER NOT NULL
+    )""")
+    for stmt in (
+        "CREATE INDEX idx_players_norm ON players (name_norm)",
+        "CREATE INDEX idx_tanks_tier_type ON tanks (tier, type)",
+        "CREATE INDEX idx_submissions_tank_score ON submissions (tank_id, score DESC, id)",
+        "CREATE INDEX idx_submissions_score ON submissions (score DESC, id)",
+        "CREATE INDEX idx_submissions_player ON submissions (player_id)",
+        "CREATE INDEX idx_tank_records_score ON tank_records (score DESC, submission_id)",
+        "CREATE INDEX idx_tank_records_player ON tank_records (player_id)",
+    ):
+        await db.execute(stmt)
+    await db.execute(_SQL_FILL_TANK_RECORDS)
+
+# Ordered schema migrations: (version, step). A step is an SQL script or an
+# async function taking the writer connection. Applied once each by init_db
+# and recorded in schema_version. Never edit a shipped step; append a new one.
+MIGRATIONS: list[tuple[int, object]] = [
+    (1, """
+    CREATE INDEX IF NOT EXISTS idx_submissions_tank_score ON submissions (tank_name, score DESC, id);
+    CREATE INDEX IF NOT EXISTS idx_submissions_score ON submissions (score DESC, id);
+    CREATE INDEX IF NOT EXISTS idx_submissions_player ON submissions (player_name_norm);
+    CREATE INDEX IF NOT EXISTS idx_tanks_tier_type ON tanks (tier, type);
+    """),
+    (2, """
+    CREATE TABLE IF NOT EXISTS tank_records (
+        tank_name TEXT PRIMARY KEY,
+        submission_id INTEGER NOT NULL,
+        player_name_raw TEXT NOT NULL,
+        player_name_norm TEXT NOT NULL,
+        score INTEGER NOT NULL,
+        submitted_by TEXT NOT NULL,
+        created_at TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_tank_records_score ON tank_records (score DESC, submission_id);
+    CREATE INDEX IF NOT EXISTS idx_tank_records_player ON tank_records (player_name_norm);
+    DELETE FROM tank_records;
+    INSERT INTO tank_records (tank_name, submission_id, player_name_raw, player_name_norm, score, submitted_by, created_at)
+    SELECT tank_name, id, player_name_raw, player_name_norm, score, submitted_by, created_at
+    FROM (
+        SELECT s.*, ROW_NUMBER() OVER (PARTITION BY s.tank_name ORDER BY s.score DESC, s.id ASC) AS rn
+        FROM submissions s
+    )
+    WHERE rn = 1;
+    """),
+    (3, _migrate_surrogate_keys),
+    (4, """
+    DROP INDEX IF EXISTS idx_submissions_player;
+    CREATE INDEX IF NOT EXISTS idx_submissions_player_tank ON submissions (player_id, tank_id, score DESC, id);
+    """),
+    (5, """
+    CREATE TABLE IF NOT EXISTS stats_counters (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    );
+    INSERT OR REPLACE INTO stats_counters (name, value) VALUES
+        ('tanks', (SELECT COUNT(*) FROM tanks)),
+        ('submissions', (SELECT COUNT(*) FROM submissions)),
+        ('tank_index_posts', (SELECT COUNT(*) FROM tank_index_posts));
+    CREATE TRIGGER IF NOT EXISTS trg_tanks_count_ins AFTER INSERT ON tanks
+        BEGIN UPDATE stats_counters SET value = value + 1 WHERE name = 'tanks'; END;
+    CREATE TRIGGER IF NOT EXISTS trg_tanks_count_del AFTER DELETE ON tanks
+        BEGIN UPDATE stats_counters SET value = value - 1 WHERE name = 'tanks'; END;
+    CREATE TRIGGER IF NOT EXISTS trg_submissions_count_ins AFTER INSERT ON submissions
+        BEGIN UPDATE stats_counters SET value = value + 1 WHERE name = 'submissions'; END;
+    CREATE TRIGGER IF NOT EXISTS trg_submissions_count_del AFTER DELETE ON submissions
+        BEGIN UPDATE stats_counters SET value = value - 1 WHERE name = 'submissions'; END;
+    CREATE TRIGGER IF NOT EXISTS trg_index_posts_count_ins AFTER INSERT ON tank_index_posts
+        BEGIN UPDATE stats_counters SET value = value + 1 WHERE name = 'tank_index_posts'; END;
+    CREATE TRIGGER IF NOT EXISTS trg_index_posts_count_del AFTER DELETE ON tank_index_posts
+        BEGIN UPDATE stats_counters SET value = value - 1 WHERE name = 'tank_index_posts'; END;
+    """),
+    (6, """
+    INSERT OR IGNORE INTO stats_counters (name, value)
+    VALUES ('archived_submissions', (SELECT COUNT(*) FROM history.submissions));
+    """),
+    (7, _migrate_window_bests),
+    (8, """
+    ALTER TABLE tank_index_posts ADD COLUMN content_hash TEXT;
+    ALTER TABLE tank_index_posts ADD COLUMN meta_hash TEXT;
+    """),
+    (9, """
+    CREATE TABLE IF NOT EXISTS index_rebuild_queue (
+        tier INTEGER NOT NULL,
+        type TEXT NOT NULL,
+        force INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (tier, type)
+    );
+    """),
+    # A forum post's starter message has the thread's id.
+    (10, """
+    ALTER TABLE tank_index_posts ADD COLUMN starter_message_id INTEGER;
+    UPDATE tank_index_posts SET starter_message_id = thread_id;
+    """),
+    # Follow-up messages of buckets too long for the starter message (page 0).
+    (11, """
+    CREATE TABLE IF NOT EXISTS index_post_pages (
+        tier INTEGER NOT NULL,
+        type TEXT NOT NULL,
+        page INTEGER NOT NULL,
+        message_id INTEGER NOT NULL,
+        content_hash TEXT,
+        PRIMARY KEY (tier, type, page)
+    );
+    """),
+]
+
+# ---- history archive ----
+# Old submissions that no longer hold a record are moved to a separate
+# history.db, ATTACHed to every connection as `history`. Readers that need
+# the full history query the all_submissions TEMP view (a main-schema view
+# cannot reference an attached database). Ids never collide: history rows
+# keep the id they had in main.
+HISTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS history.submissions (
+    id INTEGER PRIMARY KEY,
+    player_id INTEGER NOT NULL,
+    tank_id INTEGER NOT NULL,
+    score INTEGER NOT NULL,
+    submitted_by_id INTEGER NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS history.idx_history_player_tank ON submissions (player_id, tank_id, score DESC, id);
+CREATE INDEX IF NOT EXISTS history.idx_history_tank_score ON submissions (tank_id, score DESC, id);
+CREATE INDEX IF NOT EXISTS history.idx_history_created ON submissions (created_at);
+"""
+
+# A row is copied to history and deleted from main in two separate commits
+# (WAL transactions are not atomic across attached files), so for a moment it
+# can exist in both; the NOT EXISTS keeps it from being counted twice.
+ALL_SUBMISSIONS_VIEW = """
+CREATE TEMP VIEW IF NOT EXISTS all_submissions AS
+SELECT id, player_id, tank_id, score, submitted_by_id, created_at FROM main.submissions
+UNION ALL
+SELECT h.id, h.player_id, h.tank_id, h.score, h.submitted_by_id, h.created_at
+FROM history.submissions h
+WHERE NOT EXISTS (SELECT 1 FROM main.submissions m WHERE m.id = h.id);
+"""
+
+# ---- connection layer ----
+# One long-lived writer plus a small pool of readers. WAL lets the readers
+# run alongside the writer; all writes are serialized through _write_lock.
+_writer: aiosqlite.Connection | None = None
+_readers: asyncio.Queue | None = None
+_reader_conns: list[aiosqlite.Connection] = []
+_write_lock = asyncio.Lock()
+_open_lock = asyncio.Lock()
+
+async def _connect(readonly: bool) -> aiosqlite.Connection:
+    con = await aiosqlite.connect(config.DB_PATH)
+    if not readonly:
+        await con.execute("PRAGMA journal_mode=WAL")
+    await con.execute("PRAGMA synchronous=NORMAL")
+    await con.execute("PRAGMA busy_timeout=5000")
+    await con.execute("PRAGMA temp_store=MEMORY")
+    await con.execute(f"PRAGMA cache_size=-{config.DB_CACHE_MB * 1024}")
+    await con.execute(f"PRAGMA mmap_size={config.DB_MMAP_MB * 1024 * 1024}")
+    await con.execute("ATTACH DATABASE ? AS history", (config.HISTORY_DB_PATH,))
+    if not readonly:
+        await con.execute("PRAGMA history.journal_mode=WAL")
+        await con.executescript(HISTORY_SCHEMA)
+    await con.execute("PRAGMA history.synchronous=NORMAL")
+    if readonly:
+        await con.execute("PRAGMA query_only=ON")
+    return con
+
+async def _create_views():
+    # Run after migrations: a temp view over a table that a migration is
+    # about to rebuild would make that migration's ALTER TABLE fail.
+    await _writer.execute(ALL_SUBMISSIONS_VIEW)
+    for con in _reader_conns:
+        await con.execute("PRAGMA query_only=OFF")
+        await con.execute(ALL_SUBMISSIONS_VIEW)
+        await con.execute("PRAGMA query_only=ON")
+
+async def _ensure_open():
+    global _writer, _readers
+    if _writer is not None:
+        return
+    async with _open_lock:
+        if _writer is not None:
+            return
+        # Writer first: it switches the file to WAL before readers attach.
+        writer = await _connect(readonly=False)
+        readers: asyncio.Queue = asyncio.Queue()
+        for _ in range(max(1, config.DB_READERS)):
+            con = await _connect(readonly=True)
+            _reader_conns.append(con)
+            readers.put_nowait(con)
+        _readers = readers
+        _writer = writer
+
+@asynccontextmanager
+async def _read():
+    await _ensure_open()
+    con = await _readers.get()
+    try:
+        yield con
+    finally:
+        _readers.put_nowait(con)
+
+@asynccontextmanager
+async def _write(bump: bool = True):
+    # bump=False is for bookkeeping writes (forum index state) that no cached
+    # read depends on, so they don't throw away the query cache.
+    await _ensure_open()
+    async with _write_lock:
+        try:
+            yield _writer
+            await _writer.commit()
+            if bump:
+                _bump_generation()
+        except BaseException:
+            await _writer.rollback()
+            raise
+
+# ---- query instrumentation ----
+# Named reads go through _fetch and write transactions through _timed; both
+# record into querystats.stats when DB_STATS_ENABLED. Anything slower than
+# DB_SLOW_QUERY_MS is logged (reads with their EXPLAIN QUERY PLAN).
+_qstats = querystats.stats
+
+async def _fetch(db, name: str, sql: str, args: tuple = (), one: bool = False):
+    if not config.DB_STATS_ENABLED:
+        cur = await db.execute(sql, args)
+        return await (cur.fetchone() if one else cur.fetchall())
+    started = time.perf_counter()
+    cur = await db.execute(sql, args)
+    result = await (cur.fetchone() if one else cur.fetchall())
+    ms = (time.perf_counter() - started) * 1000
+    _qstats.record(name, ms, int(result is not None) if one else len(result))
+    if ms >= config.DB_SLOW_QUERY_MS:
+        _qstats.mark_slow(name)
+        plan = await db.execute_fetchall("EXPLAIN QUERY PLAN " + sql, args)
+        log.warning(f"Slow query {name}: {ms:.1f} ms; plan: {' | '.join(r[3] for r in plan)}")
+    return result
+
+@asynccontextmanager
+async def _timed(name: str, rows: int = 0):
+    if not config.DB_STATS_ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    yield
+    ms = (time.perf_counter() - started) * 1000
+    _qstats.record(name, ms, rows)
+    if ms >= config.DB_SLOW_QUERY_MS:
+        _qstats.mark_slow(name)
+        log.warning(f"Slow write {name}: {ms:.1f} ms ({rows} rows)")
+
+def query_stats() -> list[dict]:
+    return _qstats.summary()
+
+# ---- query result cache ----
+# Results of the aggregate reads below, keyed by (function, arguments). Every
+# committed write bumps the generation and drops the cache, so entries are
+# only ever served between two writes. Cached values are shared between
+# callers and must not be mutated.
+_cache: dict[tuple, object] = {}
+_cache_gen = 0
+_cache_stats = {"hits": 0, "misses": 0}
+_CACHE_MAX_ENTRIES = 1024
+
+def _bump_generation():
+    global _cache_gen
+    _cache_gen += 1
+    _cache.clear()
+
+def query_cache_stats() -> dict:
+    out = dict(_cache_stats)
+    out["generation"] = _cache_gen
+    out["entries"] = len(_cache)
+    total = out["hits"] + out["misses"]
+    out["hit_rate"] = out["hits"] / total if total else 0.0
+    return out
+
+def _cached(fn):
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        key = (fn.__name__, args, tuple(sorted(kwargs.items())))
+        if key in _cache:
+            _cache_stats["hits"] += 1
+            return _cache[key]
+        _cache_stats["misses"] += 1
+        gen = _cache_gen
+        value = await fn(*args, **kwargs)
+        # A write that committed while we were reading makes this result stale.
+        if gen == _cache_gen:
+            if len(_cache) >= _CACHE_MAX_ENTRIES:
+                _cache.clear()
+            _cache[key] = value
+        return value
+    return wrapper
+
+async def _schema_version(db) -> int:
+    await db.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER PRIMARY KEY, applied_at TEXT NOT NULL)")
+    row = await (await db.execute("SELECT MAX(version) FROM schema_version")).fetchone()
+    return int(row[0] or 0)
+
+async def _migrate(db):
+    current = await _schema_version(db)
+    record = "INSERT INTO schema_version (version, applied_at) VALUES ({version}, strftime('%Y-%m-%dT%H:%M:%S', 'now'));"
+    for version, step in MIGRATIONS:
+        if version <= current:
+            continue
+        if callable(step):
+            await db.execute("BEGIN")
+            await step(db)
+            await db.execute(record.format(version=version))
+            await db.commit()
+        else:
+            # executescript runs in autocommit mode, so wrap each step explicitly.
+            await db.executescript("BEGIN;\n" + step + "\n" + record.format(version=version) + "\nCOMMIT;")
+        log.info(f"Applied schema migration {version}")
+
 async def init_db():
-    async with aiosqlite.connect(config.DB_PATH) as db:
+    await _ensure_open()
+    async with _write() as db:
         await db.executescript(SCHEMA)
-        await db.commit()
+        await _migrate(db)
+        await _create_views()
+    for name, plan in await check_query_plans():
+        log.warning(f"Query {name} falls back to a table scan: {plan}")
+
+async def close_db():
+    global _writer, _readers
+    await _stop_submit_worker()
+    async with _write_lock:
+        for con in _reader_conns:
+            await con.close()
+        _reader_conns.clear()
+        _readers = None
+        if _writer is not None:
+            await _writer.close()
+            _writer = None
+
+# Full record rows: (tank_name, submission_id, player_raw, player_norm, score, submitted_by, created_at)
+_SQL_RECORD_ROWS = """
+SELECT t.name, r.submission_id, p.name_raw, p.name_norm, r.score, b.name_raw, s.created_at
+FROM tank_records r
+JOIN tanks t ON t.id = r.tank_id
+JOIN submissions s ON s.id = r.submission_id
+JOIN players p ON p.id = r.player_id
+JOIN players b ON b.id = s.submitted_by_id
+"""
+
+# Every player's best per tank (archived rows included), for the rank index.
+_SQL_PLAYER_TANK_BESTS = """
+SELECT t.name, p.name_norm, MAX(s.score)
+FROM all_submissions s
+JOIN players p ON p.id = s.player_id
+JOIN tanks t ON t.id = s.tank_id
+GROUP BY t.name, p.name_norm
+"""
+
+# ---- in-memory leaderboard ----
+# Once loaded, leaderboard.engine answers the roster and ranking reads below;
+# the SQL paths stay as the fallback and as the reference for the checker.
+_engine = leaderboard.engine
+
+async def load_leaderboard():
+    # Hold the write lock so no write can commit between the two reads.
+    await _ensure_open()
+    async with _write_lock:
+        tanks = await _fetch(_writer, "load_leaderboard_tanks", "SELECT name, tier, type FROM tanks")
+        records = await _fetch(_writer, "load_leaderboard_records", _SQL_RECORD_ROWS)
+        bests = await _fetch(_writer, "load_leaderboard_bests", _SQL_PLAYER_TANK_BESTS)
+        _engine.load(tanks, records, bests)
+        _bump_generation()
+    t, r, b = _engine.stats()
+    log.info(f"Leaderboard loaded: {t} tanks, {r} records, {b} buckets")
+
+async def check_leaderboard() -> list[str]:
+    """Compare every engine answer against SQL. Returns a list of mismatch descriptions."""
+    if not _engine.ready:
+        return ["leaderboard engine is not loaded"]
+    problems = []
+    sql_tanks = await _sql_list_tanks()
+    if list(sql_tanks) != _engine.list_tanks():
+        problems.append("roster differs")
+    for name, tier, ttype in sql_tanks:
+        sql_best = await _sql_best_for_tank(name)
+        if sql_best != _engine.best_for_tank(name):
+            problems.append(f"best for {name}: sql={sql_best} engine={_engine.best_for_tank(name)}")
+    filters = [(None, None)]
+    filters += [(tier, None) for tier in sorted({t for _, t, _ in sql_tanks})]
+    filters += [(None, tp) for tp in sorted({tp for _, _, tp in sql_tanks})]
+    filters += sorted({(t, tp) for _, t, tp in sql_tanks})
+    for tier, ttype in filters:
+        sql_champ = await _sql_champion_filtered(tier, ttype)
+        if sql_champ != _engine.champion(tier, ttype):
+            problems.append(f"champion tier={tier} type={ttype}: sql={sql_champ} engine={_engine.champion(tier, ttype)}")
+    for name, tier, ttype in sql_tanks:
+        best = _engine.best_for_tank(name)
+        if best is None:
+            continue
+        score = best[2]
+        sql_rank, eng_rank = await _sql_rank_for_tank(name, score), _engine.rank_for_tank(name, score)
+        if sql_rank != eng_rank:
+            problems.append(f"rank of {score} on {name}: sql={sql_rank} engine={eng_rank}")
+        sql_rank, eng_rank = await _sql_rank_in_bucket(tier, ttype, score), _engine.rank_in_bucket(tier, ttype, score)
+        if sql_rank != eng_rank:
+            problems.append(f"rank of {score} in tier={tier} type={ttype}: sql={sql_rank} engine={eng_rank}")
+    if list(await _sql_top_holders_by_tank(25)) != _engine.top_holders_by_tank(25):
+        problems.append("top holders by tank differ")
+    if list(await _sql_top_holders_by_tier_type(25)) != _engine.top_holders_by_tier_type(25):
+        problems.append("top holders by tier/type differ")
+    return problems
 
 async def get_tank(name: str):
-    async with aiosqlite.connect(config.DB_PATH) as db:
-        cur = await db.execute("SELECT name, tier, type FROM tanks WHERE name = ?", (name,))
-        return await cur.fetchone()
+    if _engine.ready:
+        return _engine.get_tank(name)
+    async with _read() as db:
+        return await _fetch(db, "get_tank", "SELECT name, tier, type FROM tanks WHERE name = ?", (name,), one=True)
+
+def search_tanks(query: str, limit: int = 25) -> list[str]:
+    """Tank names matching query, for autocomplete. Served from the engine only
+    (it runs on every keystroke); empty until the engine has loaded."""
+    if not _engine.ready:
+        return []
+    return _engine.search_tanks(query, limit)
 
 async def list_tanks(tier: int | None = None, ttype: str | None = None):
+    if _engine.ready:
+        return _engine.list_tanks(tier, ttype)
+    return await _sql_list_tanks(tier, ttype)
+
+async def _sql_list_tanks(tier: int | None = None, ttype: str | None = None):
     q = "SELECT name, tier, type FROM tanks"
     args = []
     wh = []
@@ -59,170 +698,786 @@ async def list_tanks(tier: int | None = None, ttype: str | None = None):
     if wh:
         q += " WHERE " + " AND ".join(wh)
     q += " ORDER BY tier DESC, type, name"
-    async with aiosqlite.connect(config.DB_PATH) as db:
-        cur = await db.execute(q, tuple(args))
-        return await cur.fetchall()
+    async with _read() as db:
+        return await _fetch(db, "list_tanks", q, tuple(args))
 
-async def insert_submission(player_raw: str, player_norm: str, tank_name: str, score: int, submitted_by: str, created_at: str):
-    async with aiosqlite.connect(config.DB_PATH) as db:
-        await db.execute(
-            "INSERT INTO submissions (player_name_raw, player_name_norm, tank_name, score, submitted_by, created_at) VALUES (?,?,?,?,?,?)",
-            (player_raw, player_norm, tank_name, score, submitted_by, created_at),
-        )
-        await db.commit()
+async def _player_ids(db, names: dict[str, str]) -> dict[str, int]:
+    """Map raw names to players.id, creating rows as needed. names: raw -> norm."""
+    await db.executemany("INSERT OR IGNORE INTO players (name_raw, name_norm) VALUES (?,?)", list(names.items()))
+    ids = {}
+    for raw in names:
+        row = await (await db.execute("SELECT id FROM players WHERE name_raw = ?", (raw,))).fetchone()
+        ids[raw] = row[0]
+    return ids
 
-async def get_best_for_tank(tank_name: str):
-    async with aiosqlite.connect(config.DB_PATH) as db:
-        cur = await db.execute("""
-        SELECT id, player_name_raw, score, created_at
-        FROM submissions
-        WHERE tank_name = ?
-        ORDER BY score DESC, id ASC
-        LIMIT 1;
-        """, (tank_name,))
-        return await cur.fetchone()
+async def _tank_ids(db, names) -> dict[str, int]:
+    ids = {}
+    for name in names:
+        row = await (await db.execute("SELECT id FROM tanks WHERE name = ?", (name,))).fetchone()
+        if row is None:
+            raise ValueError(f"Unknown tank: {name}")
+        ids[name] = row[0]
+    return ids
 
-async def get_champion():
-    async with aiosqlite.connect(config.DB_PATH) as db:
+async def _insert_rows(db, rows: list[tuple]) -> tuple[list[int], list[tuple]]:
+    """Insert (player_raw, player_norm, tank_name, score, submitted_by, created_at)
+    rows and update tank_records inside the caller's write transaction.
+    Returns (ids in row order, new best rows per touched tank)."""
+    names: dict[str, str] = {}
+    for raw, norm, _, _, _, _ in rows:
+        names.setdefault(raw, norm)
+    for *_, by, _ in rows:
+        names.setdefault(by, normalize_player(by))
+    player_ids = await _player_ids(db, names)
+    tank_ids = await _tank_ids(db, {r[2] for r in rows})
+
+    cur = await db.execute("SELECT COALESCE(MAX(id), 0) FROM submissions")
+    before = int((await cur.fetchone())[0])
+    await db.executemany(
+        "INSERT INTO submissions (player_id, tank_id, score, submitted_by_id, created_at) VALUES (?,?,?,?,?)",
+        [(player_ids[raw], tank_ids[tank], score, player_ids[by], created) for raw, _, tank, score, by, created in rows],
+    )
+    # AUTOINCREMENT ids are strictly greater than any earlier id, so the
+    # batch is exactly the rows above `before` while we hold the writer.
+    cur = await db.execute("SELECT id FROM submissions WHERE id > ? ORDER BY id", (before,))
+    ids = [r[0] for r in await cur.fetchall()]
+
+    best: dict[str, tuple] = {}
+    for sid, (raw, norm, tank, score, by, created) in zip(ids, rows):
+        cur_best = best.get(tank)
+        if cur_best is None or score > cur_best[4]:
+            best[tank] = (sid, raw, norm, tank, score, by, created)
+    await db.executemany(
+        _SQL_UPSERT_TANK_RECORD,
+        [(tank_ids[tank], sid, player_ids[raw], score) for sid, raw, _, tank, score, _, _ in best.values()],
+    )
+    for sql in _SQL_UPSERT_WINDOW_BESTS.values():
+        await db.execute(sql, (before,))
+    return ids, list(best.values())
+
+async def _publish_records(ids: list[int], rows: list[tuple]):
+    # Every row, not just the new bests: the engine also keeps each player's
+    # best per tank for rank lookups. Runs after the commit, so it must not
+    # fail the write: on error the engine is dropped (reads fall back to SQL)
+    # and reloaded from the database.
+    try:
+        for sid, (raw, norm, tank, score, by, created) in zip(ids, rows):
+            _engine.record_submission(sid, raw, norm, tank, score, by, created)
+    except Exception as e:
+        log.error(f"Leaderboard update failed, reloading: {type(e).__name__}: {e}")
+        _engine.ready = False
+        try:
+            await load_leaderboard()
+        except Exception as e:
+            log.error(f"Leaderboard reload failed, serving from SQL: {type(e).__name__}: {e}")
+
+# ---- group commit for submissions ----
+# insert_submission() queues its row; one worker drains the queue, waiting up
+# to SUBMIT_BATCH_DELAY_MS for more rows (max SUBMIT_BATCH_SIZE), and commits
+# the whole batch as one transaction. Each caller's future resolves with its
+# own row id only after that commit.
+_submit_queue: asyncio.Queue | None = None
+_submit_task: asyncio.Task | None = None
+_submit_stats = {"batches": 0, "rows": 0, "max_batch": 0, "last_batch": 0, "failed": 0}
+
+def submit_queue_stats() -> dict:
+    out = dict(_submit_stats)
+    out["depth"] = _submit_queue.qsize() if _submit_queue is not None else 0
+    out["avg_batch"] = (out["rows"] / out["batches"]) if out["batches"] else 0.0
+    return out
+
+def _ensure_submit_worker():
+    global _submit_queue, _submit_task
+    if _submit_task is not None and not _submit_task.done():
+        return
+    if _submit_queue is None:
+        _submit_queue = asyncio.Queue()
+    _submit_task = asyncio.create_task(_submit_worker())
+
+async def _submit_worker():
+    loop = asyncio.get_running_loop()
+    stopping = False
+    while not stopping:
+        item = await _submit_queue.get()
+        if item is None:
+            return
+        batch = [item]
+        deadline = loop.time() + config.SUBMIT_BATCH_DELAY_MS / 1000
+        while len(batch) < config.SUBMIT_BATCH_SIZE:
+            if not _submit_queue.empty():
+                item = _submit_queue.get_nowait()
+            else:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(_submit_queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            if item is None:
+                stopping = True
+                break
+            batch.append(item)
+        await _commit_batch(batch)
+
+async def _commit_batch(batch: list[tuple]):
+    rows = [row for row, _ in batch]
+    try:
+        async with _timed("insert_submission_batch", len(rows)), _write() as db:
+            ids, _ = await _insert_rows(db, rows)
+    except Exception as e:
+        if len(batch) > 1:
+            # Don't let one bad row fail everyone else's submission.
+            log.warning(f"Submission batch of {len(batch)} failed ({type(e).__name__}: {e}); retrying one by one")
+            for item in batch:
+                await _commit_batch([item])
+            return
+        _submit_stats["failed"] += 1
+        fut = batch[0][1]
+        if not fut.done():
+            fut.set_exception(e)
+        return
+    _submit_stats["batches"] += 1
+    _submit_stats["rows"] += len(batch)
+    _submit_stats["last_batch"] = len(batch)
+    _submit_stats["max_batch"] = max(_submit_stats["max_batch"], len(batch))
+    # The rows are committed: callers get their ids whatever happens next.
+    try:
+        await _publish_records(ids, rows)
+    finally:
+        for (_, fut), sid in zip(batch, ids):
+            if not fut.done():
+                fut.set_result(sid)
+
+async def _stop_submit_worker():
+    global _submit_task
+    if _submit_task is None:
+        return
+    # The sentinel goes behind any queued rows, so they all commit first.
+    if not _submit_task.done():
+        _submit_queue.put_nowait(None)
+        await _submit_task
+    _submit_task = None
+
+async def insert_submission(player_raw: str, player_norm: str, tank_name: str, score: int, submitted_by: str, created_at: str) -> int:
+    """Store one submission. Returns its id once the batch holding it has committed."""
+    _ensure_submit_worker()
+    fut = asyncio.get_running_loop().create_future()
+    _submit_queue.put_nowait(((player_raw, player_norm, tank_name, score, submitted_by, created_at), fut))
+    return await fut
+
+async def bulk_insert_submissions(rows: list[tuple]) -> int:
+    """Insert many (player_raw, player_norm, tank_name, score, submitted_by, created_at)
+    rows in a single transaction. Rows must already be validated. Returns rows inserted."""
+    if not rows:
+        return 0
+    async with _timed("bulk_insert_submissions", len(rows)), _write() as db:
+        ids, _ = await _insert_rows(db, rows)
+    await _publish_records(ids, rows)
+    return len(ids)
+
+async def rebuild_tank_records() -> int:
+    """Recompute tank_records from submissions. Returns how many records were wrong or missing."""
+    async with _timed("rebuild_tank_records"), _write() as db:
+        await db.execute("CREATE TEMP TABLE IF NOT EXISTS tank_records_old AS SELECT * FROM tank_records WHERE 0")
+        await db.execute("DELETE FROM temp.tank_records_old")
+        await db.execute("INSERT INTO temp.tank_records_old SELECT * FROM tank_records")
+        await db.execute("DELETE FROM tank_records")
+        await db.execute(_SQL_FILL_TANK_RECORDS)
         cur = await db.execute("""
-        SELECT s.id, s.player_name_raw, s.tank_name, s.score,
-               s.submitted_by, s.created_at, t.tier, t.type
-        FROM submissions s
-        JOIN tanks t ON t.name = s.tank_name
-        ORDER BY s.score DESC, s.id ASC
-        LIMIT 1;
+        SELECT
+            (SELECT COUNT(*) FROM (SELECT * FROM tank_records EXCEPT SELECT * FROM temp.tank_records_old))
+          + (SELECT COUNT(*) FROM temp.tank_records_old WHERE tank_id NOT IN (SELECT tank_id FROM tank_records))
         """)
-        return await cur.fetchone()
+        drift = int((await cur.fetchone())[0])
+        await db.execute("DROP TABLE temp.tank_records_old")
+    if drift:
+        log.warning(f"Repaired {drift} drifted tank_records rows")
+        if _engine.ready:
+            await load_leaderboard()
+    return drift
 
-async def get_recent(limit: int):
-    async with aiosqlite.connect(config.DB_PATH) as db:
-        cur = await db.execute("""
-        SELECT s.id, s.player_name_raw, s.tank_name, s.score,
-               s.submitted_by, s.created_at, t.tier, t.type
-        FROM submissions s
-        JOIN tanks t ON t.name = s.tank_name
-        ORDER BY s.id DESC
-        LIMIT ?;
-        """, (limit,))
-        return await cur.fetchall()
+async def archive_submissions(older_than_days: int, batch_size: int = 500) -> int:
+    """Move submissions older than the cutoff that hold no current record from
+    main into history.db, batch_size rows per step. Returns rows moved."""
+    cutoff = (dt.datetime.utcnow() - dt.timedelta(days=older_than_days)).replace(microsecond=0).isoformat() + "Z"
+    moved = 0
+
+    # Finish a move that was interrupted between its two commits.
+    async with _write() as db:
+        cur = await db.execute("DELETE FROM main.submissions WHERE id IN (SELECT id FROM history.submissions)")
+        if cur.rowcount > 0:
+            moved += cur.rowcount
+            await db.execute(
+                "UPDATE stats_counters SET value = value + ? WHERE name = 'archived_submissions'", (cur.rowcount,)
+            )
+
+    while True:
+        # Step 1: copy the batch into history (idempotent) and commit.
+        async with _timed("archive_copy", batch_size), _write() as db:
+            cur = await db.execute("""
+            SELECT id FROM main.submissions
+            WHERE created_at < ?
+              AND id NOT IN (SELECT submission_id FROM tank_records)
+            ORDER BY id
+            LIMIT ?
+            """, (cutoff, batch_size))
+            ids = [(r[0],) for r in await cur.fetchall()]
+            if ids:
+                await db.executemany(
+                    "INSERT OR IGNORE INTO history.submissions SELECT * FROM main.submissions WHERE id = ?", ids
+                )
+        if not ids:
+            break
+        # Step 2: only now drop them from main. A crash in between leaves the
+        # rows in both files, which the view and the cleanup above tolerate.
+        async with _timed("archive_delete", len(ids)), _write() as db:
+            await db.executemany("DELETE FROM main.submissions WHERE id = ?", ids)
+            await db.execute(
+                "UPDATE stats_counters SET value = value + ? WHERE name = 'archived_submissions'", (len(ids),)
+            )
+        moved += len(ids)
+        # Let queued submissions take the writer between batches.
+        await asyncio.sleep(0)
+
+    if moved:
+        log.info(f"Archived {moved} submissions older than {cutoff} to {config.HISTORY_DB_PATH}")
+    return moved
+
+_SQL_BEST_FOR_TANK = """
+SELECT r.submission_id, p.name_raw, r.score, s.created_at
+FROM tanks t
+JOIN tank_records r ON r.tank_id = t.id
+JOIN submissions s ON s.id = r.submission_id
+JOIN players p ON p.id = r.player_id
+WHERE t.name = ?;
+"""
+
+async def get_best_for_tank(tank_name: str):
+    if _engine.ready:
+        return _engine.best_for_tank(tank_name)
+    return await _sql_best_for_tank(tank_name)
+
+async def _sql_best_for_tank(tank_name: str):
+    async with _read() as db:
+        return await _fetch(db, "get_best_for_tank", _SQL_BEST_FOR_TANK, (tank_name,), one=True)
+
+_SQL_CHAMPION_BASE = """
+SELECT r.submission_id, p.name_raw, t.name, r.score,
+       b.name_raw, s.created_at, t.tier, t.type
+FROM tank_records r
+JOIN tanks t ON t.id = r.tank_id
+JOIN submissions s ON s.id = r.submission_id
+JOIN players p ON p.id = r.player_id
+JOIN players b ON b.id = s.submitted_by_id
+"""
+
+_SQL_CHAMPION = _SQL_CHAMPION_BASE + " ORDER BY r.score DESC, r.submission_id ASC LIMIT 1;"
+
+@_cached
+async def get_champion():
+    if _engine.ready:
+        return _engine.champion()
+    async with _read() as db:
+        return await _fetch(db, "get_champion", _SQL_CHAMPION, one=True)
+
+# Listings page by keyset on id: pass the last id of the previous page as
+# before_id. Each page is a rowid range seek, so deep pages cost the same as
+# the first one (unlike OFFSET).
+_MAX_ID = 2**63 - 1
+
+_SQL_RECENT = """
+SELECT s.id, p.name_raw, t.name, s.score,
+       b.name_raw, s.created_at, t.tier, t.type
+FROM all_submissions s
+JOIN tanks t ON t.id = s.tank_id
+JOIN players p ON p.id = s.player_id
+JOIN players b ON b.id = s.submitted_by_id
+WHERE s.id < ?
+ORDER BY s.id DESC
+LIMIT ?;
+"""
+
+async def get_recent(limit: int, before_id: int | None = None):
+    async with _read() as db:
+        return await _fetch(db, "get_recent", _SQL_RECENT, (before_id if before_id is not None else _MAX_ID, limit))
 
+# Bare name_raw comes from the row holding MIN(submission_id).
+_SQL_TOP_HOLDERS_BY_TANK = """
+SELECT name_raw, tops
+FROM (
+    SELECT p.name_raw, COUNT(*) AS tops, MIN(r.submission_id) AS first_id
+    FROM tank_records r
+    JOIN players p ON p.id = r.player_id
+    GROUP BY p.name_norm
+)
+ORDER BY tops DESC, first_id ASC
+LIMIT ?;
+"""
+
+@_cached
 async def top_holders_by_tank(limit: int = 10):
     limit = max(1, min(limit, 25))
-    async with aiosqlite.connect(config.DB_PATH) as db:
-        cur = await db.execute("""
-        WITH ranked AS (
-            SELECT
-                s.player_name_raw,
-                s.player_name_norm,
-                s.tank_name,
-                s.score,
-                s.id,
-                ROW_NUMBER() OVER (
-                    PARTITION BY s.tank_name
-                    ORDER BY s.score DESC, s.id ASC
-                ) AS rn
-            FROM submissions s
-        )
-        SELECT player_name_raw, COUNT(*) AS tops
-        FROM ranked
-        WHERE rn = 1
-        GROUP BY player_name_norm
-        ORDER BY tops DESC, MIN(id) ASC
-        LIMIT ?;
-        """, (limit,))
-        return await cur.fetchall()
+    if _engine.ready:
+        return _engine.top_holders_by_tank(limit)
+    return await _sql_top_holders_by_tank(limit)
+
+async def _sql_top_holders_by_tank(limit: int):
+    async with _read() as db:
+        return await _fetch(db, "top_holders_by_tank", _SQL_TOP_HOLDERS_BY_TANK, (limit,))
 
+_SQL_TOP_HOLDERS_BY_TIER_TYPE = """
+WITH ranked AS (
+    SELECT
+        r.player_id,
+        r.submission_id,
+        ROW_NUMBER() OVER (
+            PARTITION BY t.tier, t.type
+            ORDER BY r.score DESC, r.submission_id ASC
+        ) AS rn
+    FROM tank_records r
+    JOIN tanks t ON t.id = r.tank_id
+)
+SELECT name_raw, tops
+FROM (
+    SELECT p.name_raw, COUNT(*) AS tops, MIN(ranked.submission_id) AS first_id
+    FROM ranked
+    JOIN players p ON p.id = ranked.player_id
+    WHERE ranked.rn = 1
+    GROUP BY p.name_norm
+)
+ORDER BY tops DESC, first_id ASC
+LIMIT ?;
+"""
+
+@_cached
 async def top_holders_by_tier_type(limit: int = 10):
     limit = max(1, min(limit, 25))
-    async with aiosqlite.connect(config.DB_PATH) as db:
-        cur = await db.execute("""
-        WITH ranked AS (
-            SELECT
-                s.player_name_raw,
-                s.player_name_norm,
-                t.tier,
-                t.type,
-                s.score,
-                s.id,
-                ROW_NUMBER() OVER (
-                    PARTITION BY t.tier, t.type
-                    ORDER BY s.score DESC, s.id ASC
-                ) AS rn
-            FROM submissions s
-            JOIN tanks t ON t.name = s.tank_name
-        )
-        SELECT player_name_raw, COUNT(*) AS tops
-        FROM ranked
-        WHERE rn = 1
-        GROUP BY player_name_norm
-        ORDER BY tops DESC, MIN(id) ASC
-        LIMIT ?;
-        """, (limit,))
-        return await cur.fetchall()
+    if _engine.ready:
+        return _engine.top_holders_by_tier_type(limit)
+    return await _sql_top_holders_by_tier_type(limit)
+
+async def _sql_top_holders_by_tier_type(limit: int):
+    async with _read() as db:
+        return await _fetch(db, "top_holders_by_tier_type", _SQL_TOP_HOLDERS_BY_TIER_TYPE, (limit,))
+
+# ---- history snapshot ----
+# /highscore history reads a page of recent submissions, the champion and
+# both #1-holder rankings inside one read transaction, so all of it comes
+# from the same WAL snapshot. One ROW_NUMBER pass over tank_records feeds
+# both rankings: every record counts as a tank top, rn = 1 as a bucket top.
+# A player's display name is the name_raw of their earliest record (earliest
+# bucket top for the bucket ranking), as in the queries above.
+_SQL_HOLDER_TOPS = """
+WITH ranked AS (
+    SELECT
+        r.player_id,
+        r.submission_id,
+        ROW_NUMBER() OVER (
+            PARTITION BY t.tier, t.type
+            ORDER BY r.score DESC, r.submission_id ASC
+        ) = 1 AS bucket_top
+    FROM tank_records r
+    JOIN tanks t ON t.id = r.tank_id
+)
+SELECT MIN(tank_name), COUNT(*), MIN(submission_id),
+       MIN(bucket_name), SUM(bucket_top), MIN(CASE WHEN bucket_top THEN submission_id END)
+FROM (
+    SELECT
+        p.name_norm,
+        ranked.submission_id,
+        ranked.bucket_top,
+        FIRST_VALUE(p.name_raw) OVER (PARTITION BY p.name_norm ORDER BY ranked.submission_id) AS tank_name,
+        FIRST_VALUE(p.name_raw) OVER (
+            PARTITION BY p.name_norm ORDER BY NOT ranked.bucket_top, ranked.submission_id
+        ) AS bucket_name
+    FROM ranked
+    JOIN players p ON p.id = ranked.player_id
+)
+GROUP BY name_norm;
+"""
+
+@_cached
+async def history_snapshot(limit: int, before_id: int | None = None, tops: int = 5):
+    """(recent rows, champion, top holders by tank, top holders by tier/type),
+    all from one read transaction. recent rows and champion have the
+    get_recent / get_champion shapes; rankings are (name_raw, tops) rows."""
+    async with _read() as db:
+        await db.execute("BEGIN")
+        try:
+            recent = await _fetch(db, "get_recent", _SQL_RECENT, (before_id if before_id is not None else _MAX_ID, limit))
+            champ = await _fetch(db, "get_champion", _SQL_CHAMPION, one=True)
+            holders = await _fetch(db, "history_holder_tops", _SQL_HOLDER_TOPS)
+        finally:
+            await db.execute("COMMIT")
+    by_tank = sorted(holders, key=lambda r: (-r[1], r[2]))
+    by_bucket = sorted((r for r in holders if r[4]), key=lambda r: (-r[4], r[5]))
+    return (
+        recent,
+        champ,
+        [(r[0], r[1]) for r in by_tank[:tops]],
+        [(r[3], r[4]) for r in by_bucket[:tops]],
+    )
+
+# ---- bucket leaderboards (forum index) ----
+# Every tank of a bucket with its current record, in one read: rows are
+# (tank, submission_id, player, score, created_at), the last four None for a
+# tank without submissions. Records come from tank_records (or the engine),
+# i.e. the same answer get_best_for_tank gives per tank.
+_SQL_BUCKET_LEADERBOARD_BASE = """
+SELECT t.name, r.submission_id, p.name_raw, r.score, s.created_at, t.tier, t.type
+FROM tanks t
+LEFT JOIN tank_records r ON r.tank_id = t.id
+LEFT JOIN submissions s ON s.id = r.submission_id
+LEFT JOIN players p ON p.id = r.player_id
+"""
+_SQL_BUCKET_LEADERBOARD = _SQL_BUCKET_LEADERBOARD_BASE + " WHERE t.tier = ? AND t.type = ? ORDER BY t.name;"
+_SQL_ALL_BUCKET_LEADERBOARDS = _SQL_BUCKET_LEADERBOARD_BASE + " ORDER BY t.tier DESC, t.type, t.name;"
+
+def _engine_bucket_rows(tanks) -> list[tuple]:
+    rows = []
+    for name, _, _ in tanks:
+        best = _engine.best_for_tank(name)
+        if best:
+            sid, player, score, created = best
+            rows.append((name, sid, player, score, created))
+        else:
+            rows.append((name, None, None, None, None))
+    return rows
+
+async def bucket_leaderboard(tier: int, ttype: str) -> list[tuple]:
+    if _engine.ready:
+        return _engine_bucket_rows(_engine.list_tanks(tier, ttype))
+    async with _read() as db:
+        rows = await _fetch(db, "bucket_leaderboard", _SQL_BUCKET_LEADERBOARD, (tier, ttype))
+    return [tuple(r[:5]) for r in rows]
+
+async def all_bucket_leaderboards() -> dict[tuple[int, str], list[tuple]]:
+    """bucket_leaderboard() for every (tier, type) that has tanks, in one pass."""
+    out: dict[tuple[int, str], list[tuple]] = {}
+    if _engine.ready:
+        for tank in _engine.list_tanks():
+            out.setdefault((int(tank[1]), tank[2]), []).extend(_engine_bucket_rows([tank]))
+        return out
+    async with _read() as db:
+        rows = await _fetch(db, "all_bucket_leaderboards", _SQL_ALL_BUCKET_LEADERBOARDS)
+    for r in rows:
+        out.setdefault((int(r[5]), r[6]), []).append(tuple(r[:5]))
+    return out
+
+# ---- rank lookup ----
+# Rank a score would get if submitted now: 1 + other players whose best on the
+# tank (or bucket) is >= score (ties go to the earlier submission), out of
+# every other player ranked there plus this one. Served by the engine in
+# O(log n); the SQL path counts through idx_submissions_tank_score.
+# Parameters: ?1 score, ?2 player_norm to leave out, then the tank filter's.
+def _rank_sql(tanks_where: str) -> str:
+    players_on = f"""
+             SELECT x.player_id FROM all_submissions x
+             WHERE x.tank_id IN (SELECT t.id FROM tanks t WHERE {tanks_where})"""
+    return f"""
+SELECT
+    (SELECT COUNT(DISTINCT p.name_norm) FROM players p
+     WHERE p.name_norm <> ?2 AND p.id IN ({players_on} AND x.score >= ?1)),
+    (SELECT COUNT(DISTINCT p.name_norm) FROM players p
+     WHERE p.name_norm <> ?2 AND p.id IN ({players_on}));
+"""
+
+_SQL_RANK_FOR_TANK = _rank_sql("t.name = ?3")
+_SQL_RANK_IN_BUCKET = _rank_sql("t.tier = ?3 AND t.type = ?4")
+
+async def rank_for_tank(tank_name: str, score: int, player_norm: str | None = None) -> tuple[int, int]:
+    """(rank, players ranked) the score would get on tank_name; player_norm's own best is left out."""
+    if _engine.ready:
+        return _engine.rank_for_tank(tank_name, score, player_norm)
+    return await _sql_rank_for_tank(tank_name, score, player_norm)
+
+async def _sql_rank_for_tank(tank_name: str, score: int, player_norm: str | None = None) -> tuple[int, int]:
+    async with _read() as db:
+        ahead, others = await _fetch(db, "rank_for_tank", _SQL_RANK_FOR_TANK,
+                                     (score, player_norm or "", tank_name), one=True)
+    return ahead + 1, others + 1
+
+async def rank_in_bucket(tier: int, ttype: str, score: int, player_norm: str | None = None) -> tuple[int, int]:
+    """Same as rank_for_tank, over every tank of the (tier, type) bucket."""
+    if _engine.ready:
+        return _engine.rank_in_bucket(tier, ttype, score, player_norm)
+    return await _sql_rank_in_bucket(tier, ttype, score, player_norm)
+
+async def _sql_rank_in_bucket(tier: int, ttype: str, score: int, player_norm: str | None = None) -> tuple[int, int]:
+    async with _read() as db:
+        ahead, others = await _fetch(db, "rank_in_bucket", _SQL_RANK_IN_BUCKET,
+                                     (score, player_norm or "", tier, ttype), one=True)
+    return ahead + 1, others + 1
+
+# ---- player profile ----
+# Shared with webdash, which runs them on its own read-only connection.
+# They read all_submissions, so archived rows still count. Every query starts
+# from idx_players_norm and only touches the player's own rows plus the
+# better-scoring rows on the same tanks, so cost follows the player's history
+# rather than the size of submissions. The rank subqueries use an IN list
+# rather than a join: that form lets SQLite push the correlated terms into
+# both arms of the UNION ALL view instead of materializing it.
 
+# Spellings of the player: (name_raw, submissions), latest spelling first.
+PLAYER_NAMES_SQL = """
+SELECT name_raw, n
+FROM (
+    SELECT p.name_raw, s.id AS sid,
+           COUNT(*) OVER (PARTITION BY p.id) AS n,
+           ROW_NUMBER() OVER (PARTITION BY p.id ORDER BY s.id DESC) AS rn
+    FROM players p
+    JOIN all_submissions s ON s.player_id = p.id
+    WHERE p.name_norm = ?
+)
+WHERE rn = 1
+ORDER BY sid DESC;
+"""
+
+# Personal best per tank: (tank, tier, type, submission_id, score, created_at, rank).
+# rank = 1 + other players with a better best on that tank (rank 1 = record holder).
+PLAYER_BESTS_SQL = """
+WITH mine AS (
+    SELECT s.id, s.tank_id, s.score, s.created_at,
+           ROW_NUMBER() OVER (PARTITION BY s.tank_id ORDER BY s.score DESC, s.id ASC) AS rn
+    FROM players p
+    JOIN all_submissions s ON s.player_id = p.id
+    WHERE p.name_norm = ?1
+)
+SELECT t.name, t.tier, t.type, mine.id, mine.score, mine.created_at,
+       1 + (
+           SELECT COUNT(DISTINCT o.name_norm)
+           FROM players o
+           WHERE o.name_norm <> ?1
+             AND o.id IN (
+                 SELECT x.player_id FROM all_submissions x
+                 WHERE x.tank_id = mine.tank_id
+                   AND x.score >= mine.score
+                   AND (x.score > mine.score OR x.id < mine.id)
+             )
+       ) AS rank
+FROM mine
+JOIN tanks t ON t.id = mine.tank_id
+WHERE mine.rn = 1
+ORDER BY mine.score DESC, mine.id ASC;
+"""
+
+# Best per tier/type bucket: (tier, type, tank, score, rank), where rank counts
+# other players with a better submission on any tank of that bucket.
+PLAYER_BUCKETS_SQL = """
+WITH mine AS (
+    SELECT t.tier, t.type, t.name, s.id, s.score,
+           ROW_NUMBER() OVER (PARTITION BY t.tier, t.type ORDER BY s.score DESC, s.id ASC) AS rn
+    FROM players p
+    JOIN all_submissions s ON s.player_id = p.id
+    JOIN tanks t ON t.id = s.tank_id
+    WHERE p.name_norm = ?1
+)
+SELECT mine.tier, mine.type, mine.name, mine.score,
+       1 + (
+           SELECT COUNT(DISTINCT o.name_norm)
+           FROM players o
+           WHERE o.name_norm <> ?1
+             AND o.id IN (
+                 SELECT x.player_id FROM all_submissions x
+                 WHERE x.tank_id IN (
+                         SELECT bt.id FROM tanks bt
+                         WHERE bt.tier = mine.tier AND bt.type = mine.type
+                     )
+                   AND x.score >= mine.score
+                   AND (x.score > mine.score OR x.id < mine.id)
+             )
+       ) AS rank
+FROM mine
+WHERE mine.rn = 1
+ORDER BY mine.tier DESC, mine.type;
+"""
+
+def profile_from_rows(names, bests, buckets) -> dict | None:
+    """Assemble player_profile() from the three query results (also used by webdash)."""
+    if not names:
+        return None
+    return {
+        "name": names[0][0],
+        "submissions": sum(int(n) for _, n in names),
+        "bests": [tuple(r) for r in bests],
+        "records": [r[0] for r in bests if r[6] == 1],
+        "buckets": [tuple(r) for r in buckets],
+    }
+
+@_cached
+async def player_profile(player_norm: str) -> dict | None:
+    """Personal bests, held records and bucket ranks for one player, or None if
+    they have no submissions. Keys: name, submissions, bests, records, buckets."""
+    async with _read() as db:
+        names = await _fetch(db, "player_names", PLAYER_NAMES_SQL, (player_norm,))
+        if not names:
+            return None
+        bests = await _fetch(db, "player_bests", PLAYER_BESTS_SQL, (player_norm,))
+        buckets = await _fetch(db, "player_buckets", PLAYER_BUCKETS_SQL, (player_norm,))
+    return profile_from_rows(names, bests, buckets)
+
+# Row counts are kept in stats_counters by insert/delete triggers (migration 5).
+# Note: REPLACE conflict resolution deletes rows without firing delete
+# triggers, so counted tables must use upserts instead of INSERT OR REPLACE.
+# archived_submissions is maintained by archive_submissions() instead, since
+# main-schema triggers cannot fire on an attached database.
+_COUNTED_TABLES = {
+    "tanks": "tanks",
+    "submissions": "submissions",
+    "tank_index_posts": "tank_index_posts",
+    "archived_submissions": "history.submissions",
+}
+
+@_cached
 async def counts():
-    async with aiosqlite.connect(config.DB_PATH) as db:
-        c1 = await (await db.execute("SELECT COUNT(*) FROM tanks")).fetchone()
-        c2 = await (await db.execute("SELECT COUNT(*) FROM submissions")).fetchone()
-        c3 = await (await db.execute("SELECT COUNT(*) FROM tank_index_posts")).fetchone()
-        return int(c1[0]), int(c2[0]), int(c3[0])
+    async with _read() as db:
+        c = dict(await _fetch(db, "counts", "SELECT name, value FROM stats_counters"))
+        subs = int(c.get("submissions", 0)) + int(c.get("archived_submissions", 0))
+        return int(c.get("tanks", 0)), subs, int(c.get("tank_index_posts", 0))
+
+async def repair_counters() -> dict[str, tuple[int, int]]:
+    """Recount the counted tables (hot and archived) and fix stats_counters.
+    Returns {table: (stored, actual)} for every counter that had drifted."""
+    drift = {}
+    async with _write() as db:
+        for name, table in _COUNTED_TABLES.items():
+            actual = int((await (await db.execute(f"SELECT COUNT(*) FROM {table}")).fetchone())[0])
+            row = await (await db.execute("SELECT value FROM stats_counters WHERE name = ?", (name,))).fetchone()
+            stored = int(row[0]) if row else None
+            if stored != actual:
+                drift[name] = (stored, actual)
+                await db.execute(
+                    "INSERT INTO stats_counters (name, value) VALUES (?, ?) "
+                    "ON CONFLICT (name) DO UPDATE SET value = excluded.value",
+                    (name, actual),
+                )
+    if drift:
+        log.warning(f"Repaired drifted row counters: {drift}")
+    return drift
+
+async def _log_change(db, action: str, details: str, actor: str, created_at: str):
+    await db.execute(
+        "INSERT INTO tank_changes (action, details, actor, created_at) VALUES (?,?,?,?)",
+        (action, details, actor, created_at),
+    )
 
 async def log_tank_change(action: str, details: str, actor: str, created_at: str):
-    async with aiosqlite.connect(config.DB_PATH) as db:
-        await db.execute(
-            "INSERT INTO tank_changes (action, details, actor, created_at) VALUES (?,?,?,?)",
-            (action, details, actor, created_at),
-        )
-        await db.commit()
+    async with _write() as db:
+        await _log_change(db, action, details, actor, created_at)
 
 async def add_tank(name: str, tier: int, ttype: str, actor: str, created_at: str):
-    async with aiosqlite.connect(config.DB_PATH) as db:
+    async with _write() as db:
         await db.execute(
             "INSERT INTO tanks (name, tier, type, created_at) VALUES (?,?,?,?)",
             (name, tier, ttype, created_at),
         )
-        await db.commit()
-    await log_tank_change("add", f"{name}|tier={tier}|type={ttype}", actor, created_at)
+        await _log_change(db, "add", f"{name}|tier={tier}|type={ttype}", actor, created_at)
+    _engine.add_tank(name, tier, ttype)
 
 async def edit_tank(name: str, tier: int, ttype: str, actor: str, created_at: str):
-    async with aiosqlite.connect(config.DB_PATH) as db:
+    async with _write() as db:
         await db.execute(
             "UPDATE tanks SET tier = ?, type = ? WHERE name = ?",
             (tier, ttype, name),
         )
-        await db.commit()
-    await log_tank_change("edit", f"{name}|tier={tier}|type={ttype}", actor, created_at)
+        await _log_change(db, "edit", f"{name}|tier={tier}|type={ttype}", actor, created_at)
+    _engine.move_tank(name, tier, ttype)
+
+_SQL_TANK_HAS_SUBMISSIONS = "SELECT 1 FROM tanks t JOIN tank_records r ON r.tank_id = t.id WHERE t.name = ?"
 
 async def tank_has_submissions(name: str) -> bool:
-    async with aiosqlite.connect(config.DB_PATH) as db:
-        cur = await db.execute("SELECT 1 FROM submissions WHERE tank_name = ? LIMIT 1", (name,))
-        return (await cur.fetchone()) is not None
+    if _engine.ready:
+        return _engine.tank_has_record(name)
+    async with _read() as db:
+        return (await _fetch(db, "tank_has_submissions", _SQL_TANK_HAS_SUBMISSIONS, (name,), one=True)) is not None
 
 async def remove_tank(name: str, actor: str, created_at: str):
-    if await tank_has_submissions(name):
-        raise ValueError("Tank has submissions and cannot be removed.")
-    async with aiosqlite.connect(config.DB_PATH) as db:
+    async with _write() as db:
+        # Checked on the writer so no submission can slip in between.
+        if await (await db.execute(_SQL_TANK_HAS_SUBMISSIONS, (name,))).fetchone():
+            raise ValueError("Tank has submissions and cannot be removed.")
         await db.execute("DELETE FROM tanks WHERE name = ?", (name,))
-        await db.commit()
-    await log_tank_change("remove", f"{name}", actor, created_at)
+        await _log_change(db, "remove", f"{name}", actor, created_at)
+    _engine.remove_tank(name)
 
-async def tank_changes(limit: int = 25):
-    limit = max(1, min(limit, 50))
-    async with aiosqlite.connect(config.DB_PATH) as db:
-        cur = await db.execute(
-            "SELECT id, action, details, actor, created_at FROM tank_changes ORDER BY id DESC LIMIT ?",
-            (limit,),
+async def apply_roster_diff(adds: list[tuple], edits: list[tuple], removes: list[str], actor: str,
+                            created_at: str | None = None) -> tuple[list[str], list[str]]:
+    """Apply a roster diff and its tank_changes audit rows in one transaction.
+    adds/edits are (name, tier, type); removes are names. Tanks that have
+    submissions are not removed. Returns (removed, skipped)."""
+    created_at = created_at or utc_now_z()
+    removed, skipped = [], []
+    async with _timed("apply_roster_diff", len(adds) + len(edits) + len(removes)), _write() as db:
+        await db.executemany(
+            "INSERT INTO tanks (name, tier, type, created_at) VALUES (?,?,?,?)",
+            [(n, tier, tp, created_at) for n, tier, tp in adds],
+        )
+        await db.executemany(
+            "UPDATE tanks SET tier = ?, type = ? WHERE name = ?",
+            [(tier, tp, n) for n, tier, tp in edits],
+        )
+        for n in removes:
+            if await (await db.execute(_SQL_TANK_HAS_SUBMISSIONS, (n,))).fetchone():
+                skipped.append(n)
+            else:
+                removed.append(n)
+        await db.executemany("DELETE FROM tanks WHERE name = ?", [(n,) for n in removed])
+        await db.executemany(
+            "INSERT INTO tank_changes (action, details, actor, created_at) VALUES (?,?,?,?)",
+            [("add", f"{n}|tier={tier}|type={tp}", actor, created_at) for n, tier, tp in adds]
+            + [("edit", f"{n}|tier={tier}|type={tp}", actor, created_at) for n, tier, tp in edits]
+            + [("remove", n, actor, created_at) for n in removed],
         )
-        return await cur.fetchall()
+    for n, tier, tp in adds:
+        _engine.add_tank(n, tier, tp)
+    for n, tier, tp in edits:
+        _engine.move_tank(n, tier, tp)
+    for n in removed:
+        _engine.remove_tank(n)
+    return removed, skipped
 
-async def get_champion_filtered(tier: int | None = None, ttype: str | None = None):
+_SQL_TANK_CHANGES = "SELECT id, action, details, actor, created_at FROM tank_changes WHERE id < ? ORDER BY id DESC LIMIT ?"
+
+async def tank_changes(limit: int = 25, before_id: int | None = None):
+    limit = max(1, min(limit, 50))
+    async with _read() as db:
+        return await _fetch(db, "tank_changes", _SQL_TANK_CHANGES, (before_id if before_id is not None else _MAX_ID, limit))
+
+async def list_tanks_page(limit: int, after: tuple | None = None,
+                          tier: int | None = None, ttype: str | None = None):
+    """One page of list_tanks() order (tier DESC, type, name), starting after
+    the (name, tier, type) row that ended the previous page."""
+    if _engine.ready:
+        rows = _engine.list_tanks(tier, ttype)
+        if after is not None:
+            n, t, tp = after
+            key = (-int(t), tp, n)
+            rows = [r for r in rows if (-r[1], r[2], r[0]) > key]
+        return rows[:limit]
+    q = "SELECT name, tier, type FROM tanks"
+    args = []
+    wh = []
+    if tier is not None:
+        wh.append("tier = ?")
+        args.append(tier)
+    if ttype is not None:
+        wh.append("type = ?")
+        args.append(ttype)
+    if after is not None:
+        n, t, tp = after
+        wh.append("(tier < ? OR (tier = ? AND (type > ? OR (type = ? AND name > ?))))")
+        args += [t, t, tp, tp, n]
+    if wh:
+        q += " WHERE " + " AND ".join(wh)
+    q += " ORDER BY tier DESC, type, name LIMIT ?"
+    args.append(limit)
+    async with _read() as db:
+        return await _fetch(db, "list_tanks_page", q, tuple(args))
+
+def _champion_filtered_sql(tier: int | None, ttype: str | None) -> tuple[str, tuple]:
     # If no filters, return global champion (same as get_champion)
-    q = """
-    SELECT s.id, s.player_name_raw, s.tank_name, s.score,
-           s.submitted_by, s.created_at, t.tier, t.type
-    FROM submissions s
-    JOIN tanks t ON t.name = s.tank_name
-    """
+    q = _SQL_CHAMPION_BASE
     args = []
     wh = []
     if tier is not None:
@@ -233,7 +1488,193 @@ async def get_champion_filtered(tier: int | None = None, ttype: str | None = Non
         args.append(ttype)
     if wh:
         q += " WHERE " + " AND ".join(wh)
-    q += " ORDER BY s.score DESC, s.id ASC LIMIT 1;"
-    async with aiosqlite.connect(config.DB_PATH) as db:
-        cur = await db.execute(q, tuple(args))
-        return await cur.fetchone()
+    q += " ORDER BY r.score DESC, r.submission_id ASC LIMIT 1;"
+    return q, tuple(args)
+
+@_cached
+async def get_champion_filtered(tier: int | None = None, ttype: str | None = None):
+    if _engine.ready:
+        return _engine.champion(tier, ttype)
+    return await _sql_champion_filtered(tier, ttype)
+
+async def _sql_champion_filtered(tier: int | None, ttype: str | None):
+    q, args = _champion_filtered_sql(tier, ttype)
+    async with _read() as db:
+        return await _fetch(db, "get_champion_filtered", q, args, one=True)
+
+# ---- windowed leaderboards (reads) ----
+# Shared with webdash. Periods come from window_period(); pass them in
+# explicitly so a cached answer can't outlive its period.
+WINDOW_BESTS_SQL = """
+SELECT t.name, t.tier, t.type, w.submission_id, p.name_raw, w.score, w.created_at
+FROM window_bests w
+JOIN tanks t ON t.id = w.tank_id
+JOIN players p ON p.id = w.player_id
+WHERE w.kind = ? AND w.period = ?
+ORDER BY w.score DESC, w.submission_id ASC;
+"""
+
+WINDOW_PERIODS_SQL = "SELECT DISTINCT period FROM window_bests WHERE kind = ? ORDER BY period DESC LIMIT ?;"
+
+def _window_champion_sql(kind: str, period: str, tier: int | None, ttype: str | None) -> tuple[str, tuple]:
+    q = """
+    SELECT w.submission_id, p.name_raw, t.name, w.score, b.name_raw, w.created_at, t.tier, t.type
+    FROM window_bests w
+    JOIN tanks t ON t.id = w.tank_id
+    JOIN players p ON p.id = w.player_id
+    JOIN players b ON b.id = w.submitted_by_id
+    WHERE w.kind = ? AND w.period = ?"""
+    args: list = [kind, period]
+    if tier is not None:
+        q += " AND t.tier = ?"
+        args.append(tier)
+    if ttype is not None:
+        q += " AND t.type = ?"
+        args.append(ttype)
+    q += " ORDER BY w.score DESC, w.submission_id ASC LIMIT 1;"
+    return q, tuple(args)
+
+@_cached
+async def window_champion(kind: str, period: str, tier: int | None = None, ttype: str | None = None):
+    """Best submission of the period (same row shape as get_champion), or None."""
+    q, args = _window_champion_sql(kind, period, tier, ttype)
+    async with _read() as db:
+        return await _fetch(db, "window_champion", q, args, one=True)
+
+@_cached
+async def window_tank_bests(kind: str, period: str):
+    """(tank, tier, type, submission_id, player, score, created_at) per tank, best first."""
+    async with _read() as db:
+        return await _fetch(db, "window_tank_bests", WINDOW_BESTS_SQL, (kind, period))
+
+async def window_periods(kind: str, limit: int = 12) -> list[str]:
+    """Most recent periods with submissions, newest first."""
+    async with _read() as db:
+        return [r[0] for r in await _fetch(db, "window_periods", WINDOW_PERIODS_SQL, (kind, limit))]
+
+async def rebuild_window_bests(since: str | None = None) -> int:
+    """Recompute window_bests for every period from the one holding `since`
+    (default: all history). Returns rows written."""
+    async with _timed("rebuild_window_bests"), _write() as db:
+        return await _fill_window_bests(db, since)
+
+# ---- query plan check ----
+# Hot read paths that must be served by an index. Arguments are placeholders;
+# only the plan shape matters.
+def _hot_queries() -> dict[str, tuple[str, tuple]]:
+    return {
+        "get_best_for_tank": (_SQL_BEST_FOR_TANK, ("",)),
+        "tank_has_submissions": (_SQL_TANK_HAS_SUBMISSIONS, ("",)),
+        "get_champion": (_SQL_CHAMPION, ()),
+        "get_champion_filtered": _champion_filtered_sql(10, "heavy"),
+        "top_holders_by_tank": (_SQL_TOP_HOLDERS_BY_TANK, (10,)),
+        "top_holders_by_tier_type": (_SQL_TOP_HOLDERS_BY_TIER_TYPE, (10,)),
+        "get_recent": (_SQL_RECENT, (_MAX_ID, 10)),
+        "history_holder_tops": (_SQL_HOLDER_TOPS, ()),
+        "tank_changes": (_SQL_TANK_CHANGES, (_MAX_ID, 10)),
+        "player_names": (PLAYER_NAMES_SQL, ("",)),
+        "player_bests": (PLAYER_BESTS_SQL, ("",)),
+        "player_buckets": (PLAYER_BUCKETS_SQL, ("",)),
+        "bucket_leaderboard": (_SQL_BUCKET_LEADERBOARD, (10, "heavy")),
+        "rank_for_tank": (_SQL_RANK_FOR_TANK, (0, "", "")),
+        "rank_in_bucket": (_SQL_RANK_IN_BUCKET, (0, "", 10, "heavy")),
+        "window_champion": _window_champion_sql("month", "", 10, "heavy"),
+        "window_tank_bests": (WINDOW_BESTS_SQL, ("month", "")),
+        "window_periods": (WINDOW_PERIODS_SQL, ("month", 12)),
+    }
+
+_PLAN_SCAN = re.compile(r"^SCAN (\w+)$")
+
+async def check_query_plans() -> list[tuple[str, str]]:
+    """Return (query_name, plan) for every hot query whose plan scans a table without an index."""
+    bad = []
+    async with _read() as db:
+        for name, (sql, args) in _hot_queries().items():
+            ctes = set(re.findall(r"WITH\s+(\w+)\s+AS", sql))
+            cur = await db.execute("EXPLAIN QUERY PLAN " + sql, args)
+            details = [r[3] for r in await cur.fetchall()]
+            for d in details:
+                m = _PLAN_SCAN.match(d.strip())
+                if m and m.group(1) not in ctes:
+                    bad.append((name, " | ".join(details)))
+                    break
+    return bad
+
+# content_hash / meta_hash are hashes of what forum_index last wrote to the
+# thread (starter message; title + tags), so unchanged buckets need no API calls.
+# starter_message_id lets it edit the starter message without fetching it.
+# A bucket longer than one message continues in bot-owned follow-up messages
+# (index_post_pages, page 1..N); content_hash is then the starter page's hash.
+# These writes don't bump the cache generation, so the index post count in
+# counts() can lag until the next roster or submission write.
+async def list_index_posts():
+    """(tier, type, thread_id, content_hash, meta_hash, starter_message_id) rows."""
+    async with _read() as db:
+        return await _fetch(
+            db, "list_index_posts",
+            "SELECT tier, type, thread_id, content_hash, meta_hash, starter_message_id FROM tank_index_posts",
+            (),
+        )
+
+async def set_index_post(tier: int, ttype: str, thread_id: int, forum_id: int,
+                         content_hash: str | None = None, meta_hash: str | None = None,
+                         starter_message_id: int | None = None):
+    async with _write(bump=False) as db:
+        await db.execute(
+            "INSERT INTO tank_index_posts (tier, type, thread_id, forum_channel_id, content_hash, meta_hash, starter_message_id) "
+            "VALUES (?,?,?,?,?,?,?) "
+            "ON CONFLICT (tier, type) DO UPDATE SET thread_id = excluded.thread_id, forum_channel_id = excluded.forum_channel_id, "
+            "content_hash = excluded.content_hash, meta_hash = excluded.meta_hash, "
+            "starter_message_id = excluded.starter_message_id",
+            (tier, ttype, thread_id, forum_id, content_hash, meta_hash, starter_message_id),
+        )
+        # A new thread starts without follow-up pages.
+        await db.execute("DELETE FROM index_post_pages WHERE tier = ? AND type = ?", (tier, ttype))
+
+async def list_index_post_pages():
+    """(tier, type, page, message_id, content_hash) rows, in page order."""
+    async with _read() as db:
+        return await _fetch(
+            db, "list_index_post_pages",
+            "SELECT tier, type, page, message_id, content_hash FROM index_post_pages ORDER BY tier, type, page",
+            (),
+        )
+
+async def delete_index_post(tier: int, ttype: str):
+    async with _write(bump=False) as db:
+        await db.execute("DELETE FROM tank_index_posts WHERE tier = ? AND type = ?", (tier, ttype))
+        await db.execute("DELETE FROM index_post_pages WHERE tier = ? AND type = ?", (tier, ttype))
+
+async def set_index_post_hashes(tier: int, ttype: str, content_hash: str | None, meta_hash: str | None,
+                                pages: list[tuple[int, str | None]] | None = None):
+    """pages, if given, replaces the follow-up pages: (message_id, content_hash) for page 1..N."""
+    async with _write(bump=False) as db:
+        await db.execute(
+            "UPDATE tank_index_posts SET content_hash = ?, meta_hash = ? WHERE tier = ? AND type = ?",
+            (content_hash, meta_hash, tier, ttype),
+        )
+        if pages is not None:
+            await db.execute("DELETE FROM index_post_pages WHERE tier = ? AND type = ?", (tier, ttype))
+            await db.executemany(
+                "INSERT INTO index_post_pages (tier, type, page, message_id, content_hash) VALUES (?,?,?,?,?)",
+                [(tier, ttype, i, mid, h) for i, (mid, h) in enumerate(pages, start=1)],
+            )
+
+# Buckets of a forum index rebuild that haven't been written yet; lets the
+# bot finish an interrupted rebuild after a restart.
+async def queue_index_rebuild(buckets: list[tuple[int, str]], force: bool):
+    async with _write(bump=False) as db:
+        await db.execute("DELETE FROM index_rebuild_queue")
+        await db.executemany(
+            "INSERT INTO index_rebuild_queue (tier, type, force) VALUES (?,?,?)",
+            [(tier, ttype, int(force)) for tier, ttype in buckets],
+        )
+
+async def finish_index_rebuild(tier: int, ttype: str):
+    async with _write(bump=False) as db:
+        await db.execute("DELETE FROM index_rebuild_queue WHERE tier = ? AND type = ?", (tier, ttype))
+
+async def pending_index_rebuild() -> list[tuple[int, str, int]]:
+    """(tier, type, force) rows still to do."""
+    async with _read() as db:
+        return await _fetch(db, "pending_index_rebuild", "SELECT tier, type, force FROM index_rebuild_queue ORDER BY type, tier")
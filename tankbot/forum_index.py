@@ -1,4 +1,9 @@
+import asyncio
+import contextlib
+import hashlib
 import logging
+from typing import Awaitable, Callable
+
 import discord
 
 log = logging.getLogger(__name__)
@@ -15,29 +20,96 @@ TYPE_LABEL = {
     "td": "Tank Destroyers",
 }
 
+# ---- forum state cache ----
+# The forum channel, its tags by name, the bucket threads and the
+# tank_index_posts rows are kept in memory, so an update goes straight to its
+# edit calls: no channel or thread lookup, no DB read for the mapping, and the
+# starter message is edited by its stored id without fetching it first.
+# Gateway events keep it current (see main.py): on_guild_channel_update
+# refreshes the forum and its tags, on_thread_update replaces a thread, and a
+# deleted thread drops its mapping so the bucket's thread is recreated.
+_forum: ForumChannel | None = None
+_tags: dict[str, discord.ForumTag] = {}
+_threads: dict[int, discord.Thread] = {}
+# (tier, type) -> [thread_id, content_hash, meta_hash, starter_message_id]
+_mappings: dict[tuple[int, str], list] | None = None
+# (tier, type) -> [[message_id, content_hash], ...] for follow-up pages 1..N
+_pages: dict[tuple[int, str], list[list]] = {}
+_cache_stats = {"forum_fetches": 0, "thread_fetches": 0, "events": 0}
+
+def cache_stats() -> dict:
+    out = dict(_cache_stats)
+    out["forum"] = _forum is not None
+    out["tags"] = len(_tags)
+    out["threads"] = len(_threads)
+    out["mappings"] = len(_mappings) if _mappings is not None else 0
+    return out
+
+def _set_forum(forum: ForumChannel):
+    global _forum, _tags
+    _forum = forum
+    _tags = {t.name: t for t in forum.available_tags}
+
+def on_channel_update(channel):
+    if channel.id != config.TANK_INDEX_FORUM_CHANNEL_ID or not isinstance(channel, ForumChannel):
+        return
+    _cache_stats["events"] += 1
+    _set_forum(channel)
+
+def on_thread_update(thread: discord.Thread):
+    if thread.id not in _threads:
+        return
+    _cache_stats["events"] += 1
+    _threads[thread.id] = thread
+
+async def on_thread_delete(bot: discord.Client, thread_id: int):
+    _threads.pop(thread_id, None)
+    if not _mappings:
+        return
+    for key, m in list(_mappings.items()):
+        if m[0] == thread_id:
+            _cache_stats["events"] += 1
+            del _mappings[key]
+            _pages.pop(key, None)
+            await db.delete_index_post(*key)
+            schedule_update(bot, *key)
+
 async def _get_forum(bot: discord.Client) -> ForumChannel:
+    if _forum is not None:
+        return _forum
     ch = bot.get_channel(config.TANK_INDEX_FORUM_CHANNEL_ID)
     if ch is None:
+        _cache_stats["forum_fetches"] += 1
         ch = await bot.fetch_channel(config.TANK_INDEX_FORUM_CHANNEL_ID)
     if not isinstance(ch, ForumChannel):
         raise TypeError("TANK_INDEX_FORUM_CHANNEL_ID must point to a Forum Channel")
+    _set_forum(ch)
     return ch
 
+async def _get_thread(forum: ForumChannel, thread_id: int) -> discord.Thread | None:
+    thread = _threads.get(thread_id)
+    if thread is None:
+        # Archived threads aren't in the gateway cache.
+        thread = forum.get_thread(thread_id)
+        if thread is None:
+            _cache_stats["thread_fetches"] += 1
+            try:
+                thread = await forum.fetch_thread(thread_id)
+            except Exception:
+                return None
+        _threads[thread_id] = thread
+    return thread
+
 def _thread_title(tier: int, ttype: str) -> str:
     return f"Tier {tier} — {TYPE_LABEL.get(ttype, title_case_type(ttype))}"
 
-def _find_tag(forum: ForumChannel, name: str):
-    # Forum tags are ForumTag objects
-    for t in forum.available_tags:
-        if t.name == name:
-            return t
-    return None
+def _find_tag(name: str):
+    return _tags.get(name)
 
 async def ensure_tags(forum: ForumChannel, tier: int, ttype: str):
     # Create missing tags if possible (requires Manage Channels)
     desired = [f"Tier {tier}", title_case_type(ttype)]
-    existing = {t.name for t in forum.available_tags}
-    to_create = [d for d in desired if d not in existing]
+    to_create = [d for d in desired if d not in _tags]
     if not to_create:
         return
     # Create tags via edit (append)
@@ -45,28 +117,26 @@ async def ensure_tags(forum: ForumChannel, tier: int, ttype: str):
     for name in to_create:
         new_tags.append(discord.ForumTag(name=name, moderated=False))
     try:
-        await forum.edit(available_tags=new_tags)
+        edited = await forum.edit(available_tags=new_tags)
+        if edited is not None:
+            _set_forum(edited)
     except Exception as e:
         log.warning(f"Failed to create forum tags: {type(e).__name__}: {e}")
 
 async def _render_bucket(tier: int, ttype: str) -> str:
-    # Show best per tank in this bucket, sorted by score desc
-    tanks = await db.list_tanks(tier=tier, ttype=ttype)
+    return _render_rows(tier, ttype, await db.bucket_leaderboard(tier, ttype))
+
+def _render_rows(tier: int, ttype: str, board: list[tuple]) -> str:
+    # Show best per tank in this bucket, sorted by score desc.
+    # board: db.bucket_leaderboard() rows (tank, sid, player, score, created).
     lines = []
     lines.append(f"**Leaderboard — Tier {tier} / {title_case_type(ttype)}**")
     lines.append("")
-    if not tanks:
+    if not board:
         lines.append("_No tanks registered in this bucket._")
         return "\n".join(lines)
 
-    rows = []
-    for name, _, _ in tanks:
-        best = await db.get_best_for_tank(name)
-        if best:
-            sid, player, score, created = best
-            rows.append((score, sid, player, name, created))
-        else:
-            rows.append((None, None, None, name, None))
+    rows = [(score, sid, player, name, created) for name, sid, player, score, created in board]
 
     # Sort: scored first (desc), then by name
     scored = [r for r in rows if r[0] is not None]
@@ -90,124 +160,442 @@ async def _render_bucket(tier: int, ttype: str) -> str:
 
     return "\n".join(lines)
 
+# Discord's limit on message content. A bucket longer than this continues in
+# follow-up messages posted by the bot right after the starter message.
+MESSAGE_LIMIT = 2000
+
+def _paginate(content: str, limit: int = MESSAGE_LIMIT) -> list[str]:
+    """Split content into pages of at most `limit` characters, between lines."""
+    pages: list[str] = []
+    cur: list[str] = []
+    size = 0
+    for line in content.split("\n"):
+        for part in [line[i:i + limit] for i in range(0, len(line), limit)] or [""]:
+            add = len(part) + (1 if cur else 0)
+            if cur and size + add > limit:
+                if any(cur):
+                    pages.append("\n".join(cur))
+                cur, size, add = [], 0, len(part)
+            if not cur and not part and pages:
+                continue   # no blank line at the top of a continuation page
+            cur.append(part)
+            size += add
+    if any(cur) or not pages:
+        pages.append("\n".join(cur))
+    return pages
+
+def _hash(*parts: str) -> str:
+    return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()
+
+async def _create_thread(forum: ForumChannel, tier: int, ttype: str, title: str, pages: list[str], tags,
+                         hashes: list[str], meta_hash: str):
+    thread = await forum.create_thread(name=title, content=pages[0], applied_tags=tags)
+    _threads[thread.thread.id] = thread.thread
+    # Hashes are stored only once pages and lock are done, so if either fails
+    # the retry doesn't skip the bucket and finishes the job.
+    await _set_mapping(tier, ttype, thread.thread.id, forum.id, None, None, thread.message.id)
+    # Pin starter message if possible
+    try:
+        if thread.message:
+            await thread.message.pin()
+    except Exception as e:
+        log.warning(f"Forum operation failed: {type(e).__name__}: {e}")
+    follow: list[list] = []
+    done = False
+    try:
+        await _sync_pages(thread.thread, follow, pages[1:], hashes[1:], False)
+        # Lock thread (read-only)
+        await thread.thread.edit(locked=True)
+        done = True
+    finally:
+        await _set_hashes(tier, ttype, hashes[0] if done else None, meta_hash if done else None, follow)
+
+# One update per bucket at a time (scheduler and rebuilds can overlap), so two
+# callers can't both see "no mapping" and create duplicate threads.
+_bucket_locks: dict[tuple[int, str], asyncio.Lock] = {}
 
-async def upsert_bucket_thread(bot: discord.Client, tier: int, ttype: str):
+async def upsert_bucket_thread(bot: discord.Client, tier: int, ttype: str, content: str | None = None,
+                               force: bool = False, mark: int | None = None) -> bool:
+    """Create or update the bucket's thread. Returns False if it was skipped
+    because title, tags and content match what was last written (no API calls).
+    content rendered ahead of time can pass the bucket's mark_count() from
+    before it was read; it is re-rendered if the bucket was marked since."""
+    key = (int(tier), str(ttype))
+    lock = _bucket_locks.setdefault(key, asyncio.Lock())
+    async with lock:
+        if mark is not None and _marks.get(key, 0) != mark:
+            content = None
+        return await _upsert_bucket_thread(bot, tier, ttype, content, force)
+
+async def _upsert_bucket_thread(bot: discord.Client, tier: int, ttype: str, content: str | None,
+                                force: bool) -> bool:
     forum = await _get_forum(bot)
     await ensure_tags(forum, tier, ttype)
 
     # resolve existing mapping
     mapping = await _get_mapping(tier, ttype)
     title = _thread_title(tier, ttype)
-    content = await _render_bucket(tier, ttype)
+    if content is None:
+        content = await _render_bucket(tier, ttype)
 
-    tag_tier = _find_tag(forum, f"Tier {tier}")
-    tag_type = _find_tag(forum, title_case_type(ttype))
+    tag_tier = _find_tag(f"Tier {tier}")
+    tag_type = _find_tag(title_case_type(ttype))
     tags = [t for t in [tag_tier, tag_type] if t is not None]
 
+    pages = _paginate(content)
+    hashes = [_hash(p) for p in pages]
+    content_hash = hashes[0]
+    meta_hash = _hash(title, *[t.name for t in tags])
+
     if mapping is None:
-        thread = await forum.create_thread(name=title, content=content, applied_tags=tags)
-        await _set_mapping(tier, ttype, thread.thread.id, forum.id)
-        # Pin starter message if possible
-        try:
-            starter = thread.message
-            if starter:
-                await starter.pin()
-        except Exception as e:
-            log.warning(f"Forum operation failed: {type(e).__name__}: {e}")
-        # Lock thread (read-only)
-        try:
-            await thread.thread.edit(locked=True)
-        except Exception as e:
-            log.warning(f"Forum operation failed: {type(e).__name__}: {e}")
-        return
+        await _create_thread(forum, tier, ttype, title, pages, tags, hashes, meta_hash)
+        return True
 
-    thread_id = mapping[0]
-    thread = forum.get_thread(thread_id)
-    if thread is None:
-        try:
-            thread = await forum.fetch_thread(thread_id)
-        except Exception:
-            thread = None
+    thread_id, old_content_hash, old_meta_hash, starter_id = mapping
+    follow = [list(p) for p in _pages.get((int(tier), str(ttype)), [])]
+    if (not force and old_content_hash == content_hash and old_meta_hash == meta_hash
+            and [h for _, h in follow] == hashes[1:]):
+        return False
 
+    thread = await _get_thread(forum, thread_id)
     if thread is None:
         # mapping stale -> recreate
-        thread = await forum.create_thread(name=title, content=content, applied_tags=tags)
-        await _set_mapping(tier, ttype, thread.thread.id, forum.id)
-        try:
-            if thread.message:
-                await thread.message.pin()
-        except Exception as e:
-            log.warning(f"Forum operation failed: {type(e).__name__}: {e}")
-        try:
-            await thread.thread.edit(locked=True)
-        except Exception as e:
-            log.warning(f"Forum operation failed: {type(e).__name__}: {e}")
-        return
+        await _create_thread(forum, tier, ttype, title, pages, tags, hashes, meta_hash)
+        return True
 
-    # Update title + starter content
+    # Only the parts that changed are sent. A Discord error is raised to the
+    # caller (the scheduler backs off on 429s and re-marks failed buckets);
+    # whatever was written before it is saved first, and a part that wasn't
+    # written keeps its old hash so the retry sends it.
+    new_content_hash, new_meta_hash = old_content_hash, old_meta_hash
+    locked = False
     try:
-        await thread.edit(name=title, applied_tags=tags)
-    except Exception:
-        pass
+        if force or old_meta_hash != meta_hash:
+            await thread.edit(name=title, applied_tags=tags)
+            new_meta_hash = meta_hash
+
+        if force or old_content_hash != content_hash:
+            # Edit the starter message by id; no fetch. It was pinned when the
+            # thread was created, so only a forced update pins it again.
+            starter = thread.get_partial_message(starter_id or thread.id)
+            await starter.edit(content=pages[0])
+            new_content_hash = content_hash
+            if force:
+                try:
+                    await starter.pin()
+                except Exception as e:
+                    log.warning(f"Forum operation failed: {type(e).__name__}: {e}")
 
+        await _sync_pages(thread, follow, pages[1:], hashes[1:], force)
+
+        if force or not thread.locked:
+            await thread.edit(locked=True)
+        locked = True
+    except discord.NotFound:
+        # Thread gone without an event (e.g. while offline); the retry looks
+        # it up again and recreates it.
+        _threads.pop(thread.id, None)
+        raise
+    finally:
+        # The lock is part of the title/tags state: an unlocked thread keeps
+        # no meta hash, so the retry isn't skipped.
+        await _set_hashes(tier, ttype, new_content_hash, new_meta_hash if locked else None, follow)
+    return True
+
+async def _sync_pages(thread: discord.Thread, state: list[list], pages: list[str], hashes: list[str],
+                      force: bool):
+    """Bring the thread's follow-up messages in line with pages. state is the
+    [message_id, content_hash] list of follow-ups in the thread; it is updated
+    in place after every call, so the caller can save it even if a Discord
+    call raises. Only changed pages are edited; missing pages are sent and
+    surplus ones deleted."""
+    i = 0
+    while i < min(len(state), len(pages)):
+        if force or state[i][1] != hashes[i]:
+            try:
+                await thread.get_partial_message(state[i][0]).edit(content=pages[i])
+            except discord.NotFound:
+                # Deleted by someone: re-send from this page on so the order holds.
+                break
+            state[i][1] = hashes[i]
+        i += 1
+    while len(state) > i:
+        try:
+            await thread.get_partial_message(state[-1][0]).delete()
+        except discord.NotFound:
+            pass
+        state.pop()
+    for page, h in zip(pages[len(state):], hashes[len(state):]):
+        msg = await thread.send(page)
+        state.append([msg.id, h])
+
+
+async def targeted_update(bot: discord.Client, tier: int, ttype: str):
+    await upsert_bucket_thread(bot, tier, ttype)
+
+# ---- background update scheduler ----
+# Commands call schedule_update() once their write has committed and return
+# right away. Buckets sit in a dirty set, so marks that arrive within
+# FORUM_UPDATE_DEBOUNCE_MS collapse into one render + edit per bucket. Up to
+# FORUM_UPDATE_CONCURRENCY buckets are updated at once; a 429 pauses every
+# update (retry_after, else exponential backoff) and re-marks the bucket. A
+# bucket whose update failed otherwise is re-marked up to FORUM_UPDATE_RETRIES
+# times before it is given up on (logged; /tank rebuild_index repairs it).
+_dirty: set[tuple[int, str]] = set()
+_in_flight: set[tuple[int, str]] = set()
+_wake: asyncio.Event | None = None
+_worker: asyncio.Task | None = None
+_bot: discord.Client | None = None
+_backoff_until = 0.0   # loop time
+_rate_limit_streak = 0
+_failures: dict[tuple[int, str], int] = {}
+_marks: dict[tuple[int, str], int] = {}   # schedule_update() calls per bucket
+_sched_stats = {"marked": 0, "coalesced": 0, "runs": 0, "changed": 0, "skipped": 0, "failed": 0, "retried": 0, "rate_limited": 0}
+
+def scheduler_stats() -> dict:
+    out = dict(_sched_stats)
+    out["dirty"] = len(_dirty)
+    out["in_flight"] = len(_in_flight)
     try:
-        # Fetch starter message and edit it
-        starter = thread.starter_message
-        if starter is None:
-            starter = await thread.fetch_message(thread.id)
-        await starter.edit(content=content)
+        out["backoff_s"] = max(0.0, _backoff_until - asyncio.get_running_loop().time())
+    except RuntimeError:
+        out["backoff_s"] = 0.0
+    return out
+
+def schedule_update(bot: discord.Client, tier: int, ttype: str):
+    """Mark a bucket for a background refresh. Doesn't wait for Discord."""
+    global _bot, _wake, _worker
+    _bot = bot
+    key = (int(tier), str(ttype))
+    _marks[key] = _marks.get(key, 0) + 1
+    _sched_stats["marked"] += 1
+    if key in _dirty:
+        _sched_stats["coalesced"] += 1
+    _dirty.add(key)
+    if _wake is None:
+        _wake = asyncio.Event()
+    _wake.set()
+    if _worker is None or _worker.done():
+        _worker = asyncio.create_task(_run_scheduler())
+
+async def _run_scheduler():
+    loop = asyncio.get_running_loop()
+    sem = asyncio.Semaphore(max(1, config.FORUM_UPDATE_CONCURRENCY))
+    while True:
+        await _wake.wait()
+        _wake.clear()
+        # Debounce: let more marks for the same buckets pile up first.
+        await asyncio.sleep(config.FORUM_UPDATE_DEBOUNCE_MS / 1000)
+        delay = _backoff_until - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        batch = sorted(_dirty)
+        _dirty.clear()
+        _in_flight.update(batch)
+        _sched_stats["runs"] += 1
+        await asyncio.gather(*(_update_bucket(key, sem) for key in batch))
+        if _dirty:
+            # Marked again while we were busy, or re-marked after a 429.
+            _wake.set()
+
+async def _update_bucket(key: tuple[int, str], sem: asyncio.Semaphore):
+    async with sem:
         try:
-            await starter.pin()
-        except Exception as e:
-            log.warning(f"Forum operation failed: {type(e).__name__}: {e}")
-    except Exception:
-        pass
+            result = await _try_upsert(_bot, key)
+        finally:
+            _in_flight.discard(key)
+    if result == "rate_limited":
+        _dirty.add(key)
+        return
+    _sched_stats[result] += 1
+    if result != "failed":
+        _failures.pop(key, None)
+        return
+    tries = _failures.get(key, 0) + 1
+    if tries <= config.FORUM_UPDATE_RETRIES:
+        _failures[key] = tries
+        _sched_stats["retried"] += 1
+        _dirty.add(key)
+    else:
+        _failures.pop(key, None)
+        log.error(f"Forum update for tier {key[0]} {key[1]} gave up after {tries} attempts")
+
+async def _wait_backoff():
+    delay = _backoff_until - asyncio.get_running_loop().time()
+    if delay > 0:
+        await asyncio.sleep(delay)
 
+def mark_count(tier: int, ttype: str) -> int:
+    return _marks.get((int(tier), str(ttype)), 0)
+
+async def _try_upsert(bot: discord.Client, key: tuple[int, str], content: str | None = None,
+                      force: bool = False, mark: int | None = None) -> str:
+    """One upsert attempt after any pending backoff: "changed", "skipped", "failed" or "rate_limited"."""
+    global _rate_limit_streak
+    await _wait_backoff()
     try:
-        await thread.edit(locked=True)
-    except Exception:
-        pass
+        changed = await upsert_bucket_thread(bot, *key, content=content, force=force, mark=mark)
+    except discord.RateLimited as e:
+        _rate_limited(key, e.retry_after)
+        return "rate_limited"
+    except discord.HTTPException as e:
+        if e.status == 429:
+            _rate_limited(key, None)
+            return "rate_limited"
+        log.warning(f"Forum update for tier {key[0]} {key[1]} failed: {type(e).__name__}: {e}")
+        return "failed"
+    except Exception as e:
+        log.warning(f"Forum update for tier {key[0]} {key[1]} failed: {type(e).__name__}: {e}")
+        return "failed"
+    _rate_limit_streak = 0
+    return "changed" if changed else "skipped"
 
+def _rate_limited(key: tuple[int, str], retry_after: float | None):
+    global _backoff_until, _rate_limit_streak
+    _rate_limit_streak += 1
+    wait = retry_after if retry_after else min(60.0, 2.0 ** _rate_limit_streak)
+    _backoff_until = max(_backoff_until, asyncio.get_running_loop().time() + wait)
+    _sched_stats["rate_limited"] += 1
+    log.warning(f"Forum update for tier {key[0]} {key[1]} rate limited; pausing updates for {wait:.1f}s")
 
-async def targeted_update(bot: discord.Client, tier: int, ttype: str):
-    await upsert_bucket_thread(bot, tier, ttype)
+async def stop_scheduler():
+    global _worker
+    if _worker is None:
+        return
+    _worker.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await _worker
+    _worker = None
+    if _dirty:
+        log.info(f"{len(_dirty)} pending forum bucket update(s) dropped at shutdown; /tank rebuild_index refreshes them")
+
+# ---- full rebuilds ----
+# Buckets are rendered up front and pushed through FORUM_REBUILD_CONCURRENCY
+# workers. discord.py queues each request on its per-route rate-limit bucket;
+# a 429 that still gets through pauses every forum update (shared backoff
+# above) and the bucket is retried. Pre-rendered content is only used if the
+# bucket wasn't marked dirty since it was read (checked under the bucket
+# lock), so a slow rebuild never overwrites a newer board with an older one.
+# rebuild_all() records its buckets in
+# index_rebuild_queue and removes each one once done, so a rebuild cut short
+# by a restart is finished by resume_rebuild() at startup.
+_REBUILD_ATTEMPTS = 5
+
+# progress(done, total, changed, skipped, failed)
+ProgressFn = Callable[[int, int, int, int, int], Awaitable[None]]
 
+# jobs: (bucket, pre-rendered content or None, mark_count() before it was read)
+async def _run_pool(bot: discord.Client, jobs: list[tuple[tuple[int, str], str | None, int | None]], force: bool,
+                    progress: ProgressFn | None = None, track: bool = False) -> dict[str, int]:
+    counts = {"changed": 0, "skipped": 0, "failed": 0}
+    total = len(jobs)
+    sem = asyncio.Semaphore(max(1, config.FORUM_REBUILD_CONCURRENCY))
 
-async def rebuild_all(bot: discord.Client):
+    async def work(key: tuple[int, str], content: str | None, mark: int | None):
+        async with sem:
+            result = "rate_limited"
+            for _ in range(_REBUILD_ATTEMPTS):
+                result = await _try_upsert(bot, key, content=content, force=force, mark=mark)
+                if result != "rate_limited":
+                    break
+        if result == "rate_limited":
+            result = "failed"
+        counts[result] += 1
+        # Only buckets actually written (or already current) leave the queue.
+        if track and result in ("changed", "skipped"):
+            await db.finish_index_rebuild(*key)
+        if progress is not None:
+            await progress(sum(counts.values()), total, counts["changed"], counts["skipped"], counts["failed"])
+
+    await asyncio.gather(*(work(*job) for job in jobs))
+    return counts
+
+async def rebuild_all(bot: discord.Client, force: bool = False,
+                      progress: ProgressFn | None = None) -> tuple[int, int, int]:
+    """Upsert every bucket thread. Returns (changed, skipped, failed); force
+    edits unchanged ones too. Failed buckets stay queued for resume_rebuild()."""
     # For each tier 1..10 and each type used by tanks, upsert.
-    tanks = await db.list_tanks()
-    types = sorted({t[2] for t in tanks})
-    tiers = sorted({int(t[1]) for t in tanks})
-    for ttype in types:
-        for tier in tiers:
-            await upsert_bucket_thread(bot, tier, ttype)
+    # All buckets are read and rendered in one pass up front.
+    marks = dict(_marks)
+    boards = await db.all_bucket_leaderboards()
+    types = sorted({ttype for _, ttype in boards})
+    tiers = sorted({tier for tier, _ in boards})
+    keys = [(tier, ttype) for ttype in types for tier in tiers]
+    await db.queue_index_rebuild(keys, force)
+    jobs = [(key, _render_rows(*key, boards.get(key, [])), marks.get(key, 0)) for key in keys]
+    counts = await _run_pool(bot, jobs, force, progress, track=True)
+    return counts["changed"], counts["skipped"], counts["failed"]
+
+async def resume_rebuild(bot: discord.Client):
+    """Finish a rebuild_all() that was interrupted by a restart."""
+    pending = await db.pending_index_rebuild()
+    if not pending:
+        return
+    log.info(f"Resuming forum index rebuild: {len(pending)} bucket(s) left")
+    marks = dict(_marks)
+    boards = await db.all_bucket_leaderboards()
+    counts = {"changed": 0, "skipped": 0, "failed": 0}
+    for force in (False, True):
+        jobs = [
+            ((tier, ttype), _render_rows(tier, ttype, boards.get((tier, ttype), [])), marks.get((tier, ttype), 0))
+            for tier, ttype, f in pending if bool(f) == force
+        ]
+        if jobs:
+            for k, v in (await _run_pool(bot, jobs, force, track=True)).items():
+                counts[k] += v
+    log.info(f"Forum index rebuild resumed: {counts['changed']} changed / {counts['skipped']} skipped / {counts['failed']} failed")
+
+_resume_task: asyncio.Task | None = None
 
-async def rebuild_missing(bot: discord.Client):
+def start_resume(bot: discord.Client):
+    # on_ready can fire again after a reconnect; resume only once at a time.
+    global _resume_task
+    if _resume_task is None or _resume_task.done():
+        _resume_task = asyncio.create_task(resume_rebuild(bot))
+
+async def rebuild_missing(bot: discord.Client, progress: ProgressFn | None = None) -> int:
+    """Create threads for buckets without a mapping. Returns how many were created."""
     # Only ensure mappings exist for current tiers/types. If missing mapping, create.
     tanks = await db.list_tanks()
     types = sorted({t[2] for t in tanks})
     tiers = sorted({int(t[1]) for t in tanks})
-    for ttype in types:
-        for tier in tiers:
-            if await _get_mapping(tier, ttype) is None:
-                await upsert_bucket_thread(bot, tier, ttype)
+    jobs = [
+        ((tier, ttype), None, None)
+        for ttype in types for tier in tiers
+        if await _get_mapping(tier, ttype) is None
+    ]
+    counts = await _run_pool(bot, jobs, False, progress)
+    return counts["changed"]
 
-# ---- mapping helpers in DB ----
+# ---- mapping helpers (DB, cached in _mappings) ----
 async def _get_mapping(tier: int, ttype: str):
-    import aiosqlite
-    async with aiosqlite.connect(config.DB_PATH) as con:
-        cur = await con.execute(
-            "SELECT thread_id FROM tank_index_posts WHERE tier = ? AND type = ?",
-            (tier, ttype),
-        )
-        row = await cur.fetchone()
-        return row
-
-async def _set_mapping(tier: int, ttype: str, thread_id: int, forum_id: int):
-    import aiosqlite
-    async with aiosqlite.connect(config.DB_PATH) as con:
-        await con.execute(
-            "INSERT OR REPLACE INTO tank_index_posts (tier, type, thread_id, forum_channel_id) VALUES (?,?,?,?)",
-            (tier, ttype, thread_id, forum_id),
-        )
-        await con.commit()
+    global _mappings
+    if _mappings is None:
+        rows = await db.list_index_posts()
+        _pages.clear()
+        for t, tp, _page, mid, h in await db.list_index_post_pages():
+            _pages.setdefault((int(t), tp), []).append([mid, h])
+        _mappings = {(int(r[0]), r[1]): list(r[2:]) for r in rows}
+    return _mappings.get((int(tier), str(ttype)))
+
+async def _set_mapping(tier: int, ttype: str, thread_id: int, forum_id: int,
+                       content_hash: str | None = None, meta_hash: str | None = None,
+                       starter_message_id: int | None = None):
+    await db.set_index_post(tier, ttype, thread_id, forum_id, content_hash, meta_hash, starter_message_id)
+    if _mappings is not None:
+        _mappings[(int(tier), str(ttype))] = [thread_id, content_hash, meta_hash, starter_message_id]
+    _pages.pop((int(tier), str(ttype)), None)
+
+async def _set_hashes(tier: int, ttype: str, content_hash: str | None, meta_hash: str | None,
+                      pages: list[list] | None = None):
+    await db.set_index_post_hashes(tier, ttype, content_hash, meta_hash,
+                                   [tuple(p) for p in pages] if pages is not None else None)
+    key = (int(tier), str(ttype))
+    m = _mappings.get(key) if _mappings is not None else None
+    if m is not None:
+        m[1], m[2] = content_hash, meta_hash
+    if pages is not None:
+        if pages:
+            _pages[key] = pages
+        else:
+            _pages.pop(key, None)
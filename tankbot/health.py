@@ -3,7 +3,7 @@ from zoneinfo import ZoneInfo
 import discord
 from discord import app_commands
 
-from . import config, db, backup
+from . import config, db, backup, archive, forum_index, jobs, webdash, utils
 
 _started_at = dt.datetime.utcnow()
 
@@ -52,9 +52,128 @@ async def system_health(interaction: discord.Interaction):
     if not db_ok:
         lines.append(f"- DB error: `{db_err}`")
     lines.append(f"- Tanks: `{tanks}` | Submissions: `{subs}` | Index mappings: `{idx}`")
+    q = db.submit_queue_stats()
+    lines.append(
+        f"- Submit queue: depth `{q['depth']}` | batches `{q['batches']}` | "
+        f"avg batch `{q['avg_batch']:.1f}` | max batch `{q['max_batch']}` | failed `{q['failed']}`"
+    )
+    c = db.query_cache_stats()
+    lines.append(
+        f"- Query cache: hits `{c['hits']}` | misses `{c['misses']}` | hit rate `{c['hit_rate']:.0%}` | "
+        f"entries `{c['entries']}` | generation `{c['generation']}`"
+    )
+    f = forum_index.scheduler_stats()
+    lines.append(
+        f"- Forum updates: dirty `{f['dirty']}` | in flight `{f['in_flight']}` | changed `{f['changed']}` | "
+        f"skipped `{f['skipped']}` | coalesced `{f['coalesced']}` | rate limited `{f['rate_limited']}` | "
+        f"failed `{f['failed']}` | retried `{f['retried']}` | backoff `{f['backoff_s']:.0f}s`"
+    )
+    j = jobs.job_stats()
+    lines.append(
+        f"- Background jobs: pending `{j['pending']}` | done `{j['done']}` | retried `{j['retried']}` | failed `{j['failed']}`"
+    )
+    fc = forum_index.cache_stats()
+    lines.append(
+        f"- Forum cache: forum `{fc['forum']}` | tags `{fc['tags']}` | threads `{fc['threads']}` | "
+        f"mappings `{fc['mappings']}` | fetches `{fc['forum_fetches'] + fc['thread_fetches']}` | events `{fc['events']}`"
+    )
+    last_archive = archive.last_archive_status()
+    lines.append(
+        f"- Archive: after `{config.ARCHIVE_AFTER_DAYS}` days | last run `{last_archive[0] if last_archive else 'n/a'}` "
+        f"moved `{last_archive[1] if last_archive else 0}`"
+    )
     lines.append(f"- Backups enabled: `{config.BACKUP_CHANNEL_ID != 0}`")
     lines.append(f"- Last backup: `{last_utc or 'n/a'}` (`{last_ok}`) `{last_msg or ''}`")
     lines.append(f"- Next backup: `{nxt.isoformat()}` ({config.BACKUP_TZ})")
     lines.append(f"- Dashboard: `{config.DASHBOARD_ENABLED}` on `{config.DASHBOARD_BIND}:{config.DASHBOARD_PORT}`")
+    if config.DASHBOARD_ENABLED:
+        w = webdash.cache_stats()
+        lines.append(f"- Dashboard cache: hits `{w['hits']}` | misses `{w['misses']}` | entries `{w['entries']}`")
 
     await interaction.response.send_message("\n".join(lines), ephemeral=True)
+
+@system.command(name="repair_records", description="Recompute per-tank and current week/month/season records (admins only)")
+async def system_repair_records(interaction: discord.Interaction):
+    member = interaction.user
+    if not isinstance(member, discord.Member) or not (member.guild_permissions.manage_guild or member.guild_permissions.administrator):
+        await interaction.response.send_message("Nope. You need **Manage Server** to use this.", ephemeral=True)
+        return
+    drift = await db.rebuild_tank_records()
+    # Current week/month/season only; older periods are fixed and were upserted as rows came in.
+    windows = await db.rebuild_window_bests(since=utils.utc_now_z())
+    await interaction.response.send_message(
+        f"✅ Tank records rebuilt. Repaired rows: `{drift}`. Current window rows rebuilt: `{windows}`", ephemeral=True
+    )
+
+@system.command(name="check_leaderboard", description="Compare the in-memory leaderboard against the database (admins only)")
+async def system_check_leaderboard(interaction: discord.Interaction):
+    member = interaction.user
+    if not isinstance(member, discord.Member) or not (member.guild_permissions.manage_guild or member.guild_permissions.administrator):
+        await interaction.response.send_message("Nope. You need **Manage Server** to use this.", ephemeral=True)
+        return
+    problems = await db.check_leaderboard()
+    if not problems:
+        await interaction.response.send_message("✅ Leaderboard engine matches the database.", ephemeral=True)
+        return
+    await db.load_leaderboard()
+    lines = [f"❌ {len(problems)} mismatch(es) found; engine reloaded from the database."]
+    lines += [f"- `{p}`" for p in problems[:10]]
+    msg = "\n".join(lines)
+    if len(msg) > 1800:
+        msg = msg[:1800] + "\n…(truncated)"
+    await interaction.response.send_message(msg, ephemeral=True)
+
+@system.command(name="check_counters", description="Recount table rows and repair cached counters (admins only)")
+async def system_check_counters(interaction: discord.Interaction):
+    member = interaction.user
+    if not isinstance(member, discord.Member) or not (member.guild_permissions.manage_guild or member.guild_permissions.administrator):
+        await interaction.response.send_message("Nope. You need **Manage Server** to use this.", ephemeral=True)
+        return
+    drift = await db.repair_counters()
+    if not drift:
+        await interaction.response.send_message("✅ Row counters match the tables.", ephemeral=True)
+        return
+    lines = [f"❌ {len(drift)} counter(s) had drifted and were repaired:"]
+    lines += [f"- `{name}`: stored `{stored}` → actual `{actual}`" for name, (stored, actual) in drift.items()]
+    await interaction.response.send_message("\n".join(lines), ephemeral=True)
+
+@system.command(name="db_stats", description="Show per-query database timings (admins only)")
+async def system_db_stats(interaction: discord.Interaction):
+    member = interaction.user
+    if not isinstance(member, discord.Member) or not (member.guild_permissions.manage_guild or member.guild_permissions.administrator):
+        await interaction.response.send_message("Nope. You need **Manage Server** to use this.", ephemeral=True)
+        return
+    if not config.DB_STATS_ENABLED:
+        await interaction.response.send_message("Query stats are disabled (`DB_STATS_ENABLED=0`).", ephemeral=True)
+        return
+    rows = db.query_stats()
+    if not rows:
+        await interaction.response.send_message("No queries recorded yet.", ephemeral=True)
+        return
+    fmt = lambda ms: ">1000" if ms == float("inf") else f"{ms:g}"
+    lines = [f"**DB query stats** (slow ≥ `{config.DB_SLOW_QUERY_MS:g} ms`, slowest total first)"]
+    for r in rows[:20]:
+        lines.append(
+            f"- `{r['name']}` calls `{r['calls']}` | rows `{r['rows']}` | avg `{r['avg_ms']:.2f}ms` | "
+            f"p95 `≤{fmt(r['p95_ms'])}ms` | max `{r['max_ms']:.1f}ms` | slow `{r['slow']}`"
+        )
+    msg = "\n".join(lines)
+    if len(msg) > 1800:
+        msg = msg[:1800] + "\n…(truncated)"
+    await interaction.response.send_message(msg, ephemeral=True)
+
+@system.command(name="archive", description="Move old non-record submissions to the history database now (admins only)")
+async def system_archive(interaction: discord.Interaction):
+    member = interaction.user
+    if not isinstance(member, discord.Member) or not (member.guild_permissions.manage_guild or member.guild_permissions.administrator):
+        await interaction.response.send_message("Nope. You need **Manage Server** to use this.", ephemeral=True)
+        return
+    if config.ARCHIVE_AFTER_DAYS <= 0:
+        await interaction.response.send_message("Archiving is disabled (`ARCHIVE_AFTER_DAYS=0`).", ephemeral=True)
+        return
+    await interaction.response.send_message("Archiving…", ephemeral=True)
+    moved = await archive.run_archive()
+    await interaction.followup.send(
+        f"✅ Moved `{moved}` submissions older than {config.ARCHIVE_AFTER_DAYS} days to the history database.",
+        ephemeral=True,
+    )
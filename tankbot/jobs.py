@@ -0,0 +1,84 @@
+import asyncio
+import contextlib
+import logging
+from typing import Awaitable, Callable
+
+from . import config
+
+log = logging.getLogger(__name__)
+
+# Supervised background jobs.
+#
+# Commands answer as soon as their database write has committed and hand the
+# slow Discord follow-ups (record announcements, ...) to this queue. One
+# worker runs the jobs in order. A job that raises is logged and retried after
+# a backoff (2, 4, 8 ... s), up to JOB_MAX_ATTEMPTS times, then dropped with
+# an error log. If the worker itself dies it is restarted on the next submit.
+
+JobFn = Callable[[], Awaitable[None]]
+
+_queue: asyncio.Queue | None = None
+_worker: asyncio.Task | None = None
+_retry_handles: set[asyncio.TimerHandle] = set()
+_stats = {"queued": 0, "done": 0, "retried": 0, "failed": 0}
+
+def job_stats() -> dict:
+    out = dict(_stats)
+    out["pending"] = (_queue.qsize() if _queue is not None else 0) + len(_retry_handles)
+    return out
+
+def submit(name: str, fn: JobFn):
+    """Queue fn() to run in the background. Doesn't wait for it."""
+    _stats["queued"] += 1
+    _put((name, fn, 1))
+
+def _put(job: tuple[str, JobFn, int]):
+    global _queue, _worker
+    if _queue is None:
+        _queue = asyncio.Queue()
+    _queue.put_nowait(job)
+    if _worker is None or _worker.done():
+        if _worker is not None and not _worker.cancelled() and _worker.exception() is not None:
+            log.error(f"Job worker died, restarting: {_worker.exception()!r}")
+        _worker = asyncio.create_task(_run())
+
+def _retry_later(job: tuple[str, JobFn, int], delay: float):
+    def fire():
+        _retry_handles.discard(handle)
+        _put(job)
+    handle = asyncio.get_running_loop().call_later(delay, fire)
+    _retry_handles.add(handle)
+
+async def _run():
+    while True:
+        name, fn, attempt = await _queue.get()
+        try:
+            await fn()
+            _stats["done"] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if attempt < config.JOB_MAX_ATTEMPTS:
+                delay = min(60.0, 2.0 ** attempt)
+                _stats["retried"] += 1
+                log.warning(f"Job {name} failed (attempt {attempt}), retrying in {delay:.0f}s: {type(e).__name__}: {e}")
+                _retry_later((name, fn, attempt + 1), delay)
+            else:
+                _stats["failed"] += 1
+                log.error(f"Job {name} failed after {attempt} attempts: {type(e).__name__}: {e}")
+        finally:
+            _queue.task_done()
+
+async def stop():
+    global _worker
+    pending = job_stats()["pending"]
+    for handle in _retry_handles:
+        handle.cancel()
+    _retry_handles.clear()
+    if _worker is not None:
+        _worker.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await _worker
+        _worker = None
+    if pending:
+        log.info(f"{pending} background job(s) dropped at shutdown")
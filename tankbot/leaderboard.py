@@ -0,0 +1,314 @@
+import bisect
+from collections import Counter
+
+# In-memory leaderboard engine.
+#
+# Holds the roster and the current best submission per tank, plus sorted
+# rankings per (tier, type) bucket and globally. db.py loads it once at
+# startup and updates it right after each committed write, so read paths can
+# answer without touching SQLite. Ranking keys are (-score, id, tank): higher
+# score first, earlier submission wins ties (same order as the SQL queries).
+#
+# It also keeps every player's best score per tank and per (tier, type)
+# bucket, with the bests in an ascending list per tank/bucket, so the rank an
+# arbitrary score would get is one bisect (rank_for_tank / rank_in_bucket).
+#
+# Tank names are indexed for autocomplete (search_tanks): a sorted list of
+# lowercased names answers prefix queries with a bisect, and a trigram ->
+# names map gives a fuzzy fallback for typos, ranked by trigram overlap.
+
+class Leaderboard:
+    def __init__(self):
+        self.ready = False
+        self._tanks: dict[str, tuple[int, str]] = {}             # name -> (tier, type)
+        self._records: dict[str, tuple] = {}                     # name -> (id, raw, norm, score, submitted_by, created_at)
+        self._buckets: dict[tuple[int, str], list[tuple]] = {}   # (tier, type) -> sorted ranking keys
+        self._global: list[tuple] = []                           # sorted ranking keys
+        self._tank_bests: dict[str, dict[str, int]] = {}         # tank -> player_norm -> best score
+        self._tank_scores: dict[str, list[int]] = {}             # tank -> ascending best scores
+        self._bucket_bests: dict[tuple[int, str], dict[str, int]] = {}
+        self._bucket_scores: dict[tuple[int, str], list[int]] = {}
+        self._names: list[tuple[str, str]] = []                   # sorted (lowercase name, name)
+        self._trigrams: dict[str, set[str]] = {}                  # trigram -> names
+        self._gram_counts: dict[str, int] = {}                    # name -> number of trigrams
+
+    # ---- loading ----
+    def load(self, tanks, records, bests=()):
+        """tanks: (name, tier, type) rows; records: tank_records rows
+        (tank_name, submission_id, player_raw, player_norm, score, submitted_by, created_at);
+        bests: (tank_name, player_norm, best score) rows."""
+        self._tanks = {name: (int(tier), ttype) for name, tier, ttype in tanks}
+        self._records = {r[0]: tuple(r[1:]) for r in records}
+        self._buckets = {}
+        self._global = []
+        for name, rec in self._records.items():
+            if name in self._tanks:
+                self._rank_insert(name, rec)
+        self._tank_bests = {}
+        for name, norm, score in bests:
+            self._tank_bests.setdefault(name, {})[norm] = int(score)
+        self._tank_scores = {name: sorted(b.values()) for name, b in self._tank_bests.items()}
+        self._bucket_bests = {}
+        self._bucket_scores = {}
+        for bucket in set(self._tanks.values()):
+            self._rebuild_bucket(bucket)
+        self._names = []
+        self._trigrams = {}
+        self._gram_counts = {}
+        for name in self._tanks:
+            self._index_name(name)
+        self.ready = True
+
+    # ---- ranking helpers ----
+    @staticmethod
+    def _key(name: str, rec: tuple) -> tuple:
+        return (-rec[3], rec[0], name)
+
+    def _rank_insert(self, name: str, rec: tuple):
+        key = self._key(name, rec)
+        bisect.insort(self._buckets.setdefault(self._tanks[name], []), key)
+        bisect.insort(self._global, key)
+
+    def _rank_remove(self, name: str, rec: tuple):
+        key = self._key(name, rec)
+        for keys in (self._buckets.get(self._tanks[name], []), self._global):
+            i = bisect.bisect_left(keys, key)
+            if i < len(keys) and keys[i] == key:
+                del keys[i]
+
+    # ---- player bests (rank index) ----
+    @staticmethod
+    def _raise_best(bests: dict[str, int], scores: list[int], norm: str, score: int) -> bool:
+        old = bests.get(norm)
+        if old is not None:
+            if score <= old:
+                return False
+            del scores[bisect.bisect_left(scores, old)]
+        bests[norm] = score
+        bisect.insort(scores, score)
+        return True
+
+    def _rebuild_bucket(self, bucket: tuple[int, str]):
+        merged: dict[str, int] = {}
+        for name, b in self._tank_bests.items():
+            if self._tanks.get(name) != bucket:
+                continue
+            for norm, score in b.items():
+                if score > merged.get(norm, 0):
+                    merged[norm] = score
+        if merged:
+            self._bucket_bests[bucket] = merged
+            self._bucket_scores[bucket] = sorted(merged.values())
+        else:
+            self._bucket_bests.pop(bucket, None)
+            self._bucket_scores.pop(bucket, None)
+
+    @staticmethod
+    def _rank(bests: dict[str, int], scores: list[int], score: int, player_norm: str | None) -> tuple[int, int]:
+        # A new submission loses ties to every existing one (earlier wins), so
+        # it ranks behind all bests >= score. The player's own best is left out.
+        ahead = len(scores) - bisect.bisect_left(scores, score)
+        total = len(scores) + 1
+        own = bests.get(player_norm) if player_norm is not None else None
+        if own is not None:
+            total -= 1
+            if own >= score:
+                ahead -= 1
+        return ahead + 1, total
+
+    # ---- name index ----
+    def _index_name(self, name: str):
+        bisect.insort(self._names, (name.lower(), name))
+        grams = _trigrams(name)
+        self._gram_counts[name] = len(grams)
+        for g in grams:
+            self._trigrams.setdefault(g, set()).add(name)
+
+    def _unindex_name(self, name: str):
+        i = bisect.bisect_left(self._names, (name.lower(), name))
+        if i < len(self._names) and self._names[i][1] == name:
+            del self._names[i]
+        self._gram_counts.pop(name, None)
+        for g in _trigrams(name):
+            names = self._trigrams.get(g)
+            if names is not None:
+                names.discard(name)
+                if not names:
+                    del self._trigrams[g]
+
+    # ---- writes (call after commit) ----
+    def add_tank(self, name: str, tier: int, ttype: str):
+        if not self.ready:
+            return
+        if name not in self._tanks:
+            self._index_name(name)
+        self._tanks[name] = (int(tier), ttype)
+        rec = self._records.get(name)
+        if rec is not None:
+            self._rank_insert(name, rec)
+        if name in self._tank_bests:
+            self._rebuild_bucket((int(tier), ttype))
+
+    def move_tank(self, name: str, tier: int, ttype: str):
+        if not self.ready or name not in self._tanks:
+            return
+        rec = self._records.get(name)
+        if rec is not None:
+            self._rank_remove(name, rec)
+        old_bucket = self._tanks[name]
+        self._tanks[name] = (int(tier), ttype)
+        if rec is not None:
+            self._rank_insert(name, rec)
+        if name in self._tank_bests and old_bucket != self._tanks[name]:
+            self._rebuild_bucket(old_bucket)
+            self._rebuild_bucket(self._tanks[name])
+
+    def remove_tank(self, name: str):
+        if not self.ready or name not in self._tanks:
+            return
+        rec = self._records.get(name)
+        if rec is not None:
+            self._rank_remove(name, rec)
+        bucket = self._tanks.pop(name)
+        self._unindex_name(name)
+        if name in self._tank_bests:
+            self._rebuild_bucket(bucket)
+
+    def record_submission(self, sid: int, player_raw: str, player_norm: str, tank_name: str,
+                          score: int, submitted_by: str, created_at: str):
+        if not self.ready:
+            return
+        if self._raise_best(self._tank_bests.setdefault(tank_name, {}),
+                            self._tank_scores.setdefault(tank_name, []), player_norm, score):
+            bucket = self._tanks.get(tank_name)
+            if bucket is not None:
+                self._raise_best(self._bucket_bests.setdefault(bucket, {}),
+                                 self._bucket_scores.setdefault(bucket, []), player_norm, score)
+        old = self._records.get(tank_name)
+        if old is not None and score <= old[3]:
+            return
+        rec = (sid, player_raw, player_norm, score, submitted_by, created_at)
+        if tank_name in self._tanks:
+            if old is not None:
+                self._rank_remove(tank_name, old)
+            self._records[tank_name] = rec
+            self._rank_insert(tank_name, rec)
+        else:
+            self._records[tank_name] = rec
+
+    # ---- reads (same row shapes as db.py) ----
+    def get_tank(self, name: str):
+        t = self._tanks.get(name)
+        return (name, t[0], t[1]) if t else None
+
+    def list_tanks(self, tier: int | None = None, ttype: str | None = None):
+        rows = [
+            (name, t, tp) for name, (t, tp) in self._tanks.items()
+            if (tier is None or t == tier) and (ttype is None or tp == ttype)
+        ]
+        rows.sort(key=lambda r: (-r[1], r[2], r[0]))
+        return rows
+
+    def search_tanks(self, query: str, limit: int = 25) -> list[str]:
+        """Tank names for autocomplete: case-insensitive prefix matches in name
+        order, then (if there is room) fuzzy matches by trigram overlap."""
+        q = query.strip().lower()
+        i = bisect.bisect_left(self._names, (q,))
+        out = []
+        while i < len(self._names) and len(out) < limit and self._names[i][0].startswith(q):
+            out.append(self._names[i][1])
+            i += 1
+        if len(out) >= limit or len(q) < 2:
+            return out
+        grams = _trigrams(q)
+        shared: Counter[str] = Counter()
+        for g in grams:
+            shared.update(self._trigrams.get(g, ()))
+        seen = set(out)
+        # sim >= _FUZZY_MIN needs at least _FUZZY_MIN * len(grams) shared trigrams
+        need = _FUZZY_MIN * len(grams)
+        fuzzy = []
+        for name, n in shared.items():
+            if n < need or name in seen:
+                continue
+            # Jaccard similarity of the two trigram sets
+            sim = n / (len(grams) + self._gram_counts[name] - n)
+            if sim >= _FUZZY_MIN:
+                fuzzy.append((-sim, name.lower(), name))
+        fuzzy.sort()
+        out += [name for _, _, name in fuzzy[:limit - len(out)]]
+        return out
+
+    def best_for_tank(self, name: str):
+        rec = self._records.get(name)
+        if rec is None:
+            return None
+        return (rec[0], rec[1], rec[3], rec[5])
+
+    def tank_has_record(self, name: str) -> bool:
+        return name in self._records
+
+    def rank_for_tank(self, name: str, score: int, player_norm: str | None = None) -> tuple[int, int]:
+        """(rank, players ranked) the score would get on this tank if submitted now."""
+        return self._rank(self._tank_bests.get(name, {}), self._tank_scores.get(name, []), score, player_norm)
+
+    def rank_in_bucket(self, tier: int, ttype: str, score: int, player_norm: str | None = None) -> tuple[int, int]:
+        """Same as rank_for_tank, over every tank of the (tier, type) bucket."""
+        bucket = (int(tier), ttype)
+        return self._rank(self._bucket_bests.get(bucket, {}), self._bucket_scores.get(bucket, []), score, player_norm)
+
+    def _champion_row(self, key: tuple):
+        name = key[2]
+        sid, raw, _norm, score, submitted_by, created_at = self._records[name]
+        tier, ttype = self._tanks[name]
+        return (sid, raw, name, score, submitted_by, created_at, tier, ttype)
+
+    def champion(self, tier: int | None = None, ttype: str | None = None):
+        if tier is None and ttype is None:
+            heads = self._global[:1]
+        else:
+            heads = [
+                keys[0] for (t, tp), keys in self._buckets.items()
+                if keys and (tier is None or t == tier) and (ttype is None or tp == ttype)
+            ]
+        if not heads:
+            return None
+        return self._champion_row(min(heads))
+
+    @staticmethod
+    def _top_holders(recs, limit: int):
+        # Group by normalized player; display name comes from their earliest held record.
+        by_player: dict[str, list] = {}
+        for sid, raw, norm, *_ in recs:
+            cur = by_player.get(norm)
+            if cur is None:
+                by_player[norm] = [raw, 1, sid]
+            else:
+                cur[1] += 1
+                if sid < cur[2]:
+                    cur[0], cur[2] = raw, sid
+        ranked = sorted(by_player.values(), key=lambda v: (-v[1], v[2]))
+        return [(raw, tops) for raw, tops, _ in ranked[:limit]]
+
+    def top_holders_by_tank(self, limit: int):
+        return self._top_holders(self._records.values(), limit)
+
+    def top_holders_by_tier_type(self, limit: int):
+        heads = [self._records[keys[0][2]] for keys in self._buckets.values() if keys]
+        return self._top_holders(heads, limit)
+
+    def stats(self) -> tuple[int, int, int]:
+        """(tanks, records, non-empty buckets)"""
+        return len(self._tanks), len(self._records), sum(1 for k in self._buckets.values() if k)
+
+
+# Lowest trigram similarity a fuzzy autocomplete match needs.
+_FUZZY_MIN = 0.2
+
+def _trigrams(name: str) -> set[str]:
+    # Padded like pg_trgm, so short names and word starts still match.
+    s = f"  {name.lower()} "
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+
+engine = Leaderboard()
@@ -2,13 +2,20 @@ import discord
 from discord import app_commands
 import datetime as dt
 
-from . import config, db, backup, health, webdash, logging_setup
+from . import config, db, backup, archive, forum_index, health, jobs, webdash, logging_setup
 from .commands import help_cmd, highscore, tank, backup_cmd
 
 intents = discord.Intents.default()
 intents.members = True
 
-bot = discord.Client(intents=intents)
+class TankBot(discord.Client):
+    async def close(self):
+        await forum_index.stop_scheduler()
+        await jobs.stop()
+        await db.close_db()
+        await super().close()
+
+bot = TankBot(intents=intents)
 tree = app_commands.CommandTree(bot)
 
 def _guild_obj():
@@ -18,6 +25,7 @@ def _guild_obj():
 async def on_ready():
     logging_setup.setup_logging()
     await db.init_db()
+    await db.load_leaderboard()
 
     # Start dashboard (read-only HTTP)
     webdash.start_dashboard()
@@ -26,6 +34,13 @@ async def on_ready():
     if not backup.weekly_backup_loop.is_running():
         backup.weekly_backup_loop.start(bot)
 
+    # Finish a forum index rebuild that a restart interrupted
+    forum_index.start_resume(bot)
+
+    # Start archiving of old submissions
+    if config.ARCHIVE_AFTER_DAYS > 0 and not archive.archive_loop.is_running():
+        archive.archive_loop.start()
+
     # Register commands
     guild = _guild_obj()
     help_cmd.register(tree)
@@ -44,6 +59,19 @@ async def on_ready():
 
     print(f"Logged in as {bot.user} (id={bot.user.id})")
 
+# Keep forum_index's cached forum, tags and threads in step with Discord.
+@bot.event
+async def on_guild_channel_update(before, after):
+    forum_index.on_channel_update(after)
+
+@bot.event
+async def on_thread_update(before, after):
+    forum_index.on_thread_update(after)
+
+@bot.event
+async def on_raw_thread_delete(payload):
+    await forum_index.on_thread_delete(bot, payload.thread_id)
+
 def run():
     if not config.DISCORD_TOKEN:
         raise RuntimeError("DISCORD_TOKEN is missing")
@@ -0,0 +1,77 @@
+import bisect
+import threading
+
+# Per-query timing statistics.
+#
+# db.py records every named query here (and webdash its own queries), so
+# /system db_stats and the dashboard can show which SQL is slow. Latencies go
+# into fixed histogram buckets; recording is a few integer updates under a
+# lock, since the dashboard records from its own thread.
+
+# Upper bounds (ms) of the histogram buckets; the last bucket is open-ended.
+BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+class QueryStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_name: dict[str, dict] = {}
+
+    def record(self, name: str, ms: float, rows: int):
+        with self._lock:
+            s = self._by_name.get(name)
+            if s is None:
+                s = self._by_name[name] = {
+                    "calls": 0, "rows": 0, "total_ms": 0.0, "max_ms": 0.0, "slow": 0,
+                    "hist": [0] * (len(BUCKETS_MS) + 1),
+                }
+            s["calls"] += 1
+            s["rows"] += rows
+            s["total_ms"] += ms
+            if ms > s["max_ms"]:
+                s["max_ms"] = ms
+            s["hist"][bisect.bisect_left(BUCKETS_MS, ms)] += 1
+
+    def mark_slow(self, name: str):
+        with self._lock:
+            if name in self._by_name:
+                self._by_name[name]["slow"] += 1
+
+    def reset(self):
+        with self._lock:
+            self._by_name.clear()
+
+    @staticmethod
+    def _percentile(hist: list[int], calls: int, q: float) -> float:
+        # Upper bound of the bucket holding the q-th call (inf for the open bucket).
+        need = q * calls
+        seen = 0
+        for i, n in enumerate(hist):
+            seen += n
+            if seen >= need:
+                return float(BUCKETS_MS[i]) if i < len(BUCKETS_MS) else float("inf")
+        return float("inf")
+
+    def summary(self) -> list[dict]:
+        """One dict per query name, slowest total time first."""
+        with self._lock:
+            items = [(name, dict(s, hist=list(s["hist"]))) for name, s in self._by_name.items()]
+        out = []
+        for name, s in items:
+            calls = s["calls"]
+            out.append({
+                "name": name,
+                "calls": calls,
+                "rows": s["rows"],
+                "avg_ms": s["total_ms"] / calls if calls else 0.0,
+                "p50_ms": self._percentile(s["hist"], calls, 0.50),
+                "p95_ms": self._percentile(s["hist"], calls, 0.95),
+                "max_ms": s["max_ms"],
+                "total_ms": s["total_ms"],
+                "slow": s["slow"],
+                "hist": s["hist"],
+            })
+        out.sort(key=lambda r: -r["total_ms"])
+        return out
+
+
+stats = QueryStats()
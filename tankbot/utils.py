@@ -22,6 +22,17 @@ def normalize_player(name: str) -> str:
 def utc_now_z() -> str:
     return dt.datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
 
+def normalize_timestamp(value: str) -> str:
+    # Accept ISO-8601 (optionally with trailing Z) and store it like utc_now_z().
+    v = (value or "").strip()
+    try:
+        ts = dt.datetime.fromisoformat(v.removesuffix("Z"))
+    except ValueError:
+        raise ValueError(f"Invalid timestamp: {v!r} (expected ISO-8601, e.g. 2024-05-01T18:30:00Z).")
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(dt.timezone.utc).replace(tzinfo=None)
+    return ts.replace(microsecond=0).isoformat() + "Z"
+
 def validate_text(label: str, value: str, max_len: int = 64) -> str:
     v = (value or "").strip()
     if not v:
@@ -1,11 +1,17 @@
 import threading
+import logging
 import sqlite3
 import html
 import time
 from http.server import BaseHTTPRequestHandler, HTTPServer
-from urllib.parse import urlparse, parse_qs
+from urllib.parse import urlparse, parse_qs, urlencode
 
-from . import config
+from . import config, db, querystats, utils
+
+log = logging.getLogger(__name__)
+
+# Rows per page on /recent
+_RECENT_PAGE = 50
 
 # Simple in-memory rate limiter (per IP)
 # Defaults: 60 requests per 60 seconds per IP
@@ -44,10 +50,58 @@ def _auth_ok(handler: BaseHTTPRequestHandler) -> bool:
 
     return False
 
-def _db():
-    # read-only connection (SQLite URI)
-    uri = f"file:{config.DB_PATH}?mode=ro"
-    return sqlite3.connect(uri, uri=True)
+# One persistent read-only connection plus a result cache keyed by (sql, args).
+# PRAGMA data_version changes whenever another connection (the bot) commits,
+# which is when the cache is dropped.
+_con: sqlite3.Connection | None = None
+_con_lock = threading.Lock()
+_data_version: int | None = None
+_cache: dict[tuple, list] = {}
+_cache_stats = {"hits": 0, "misses": 0}
+_CACHE_MAX_ENTRIES = 256
+
+def _db() -> sqlite3.Connection:
+    global _con
+    if _con is None:
+        # read-only connection (SQLite URI)
+        uri = f"file:{config.DB_PATH}?mode=ro"
+        con = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        con.execute("ATTACH DATABASE ? AS history", (f"file:{config.HISTORY_DB_PATH}?mode=ro",))
+        con.execute(db.ALL_SUBMISSIONS_VIEW)
+        _con = con
+    return _con
+
+def cache_stats() -> dict:
+    out = dict(_cache_stats)
+    out["entries"] = len(_cache)
+    return out
+
+def _query(name: str, sql: str, args: tuple = ()) -> list:
+    global _data_version
+    with _con_lock:
+        con = _db()
+        version = con.execute("PRAGMA data_version").fetchone()[0]
+        if version != _data_version:
+            _cache.clear()
+            _data_version = version
+        key = (sql, args)
+        if key in _cache:
+            _cache_stats["hits"] += 1
+            return _cache[key]
+        _cache_stats["misses"] += 1
+        started = time.perf_counter()
+        rows = con.execute(sql, args).fetchall()
+        if config.DB_STATS_ENABLED:
+            ms = (time.perf_counter() - started) * 1000
+            querystats.stats.record(f"web_{name}", ms, len(rows))
+            if ms >= config.DB_SLOW_QUERY_MS:
+                querystats.stats.mark_slow(f"web_{name}")
+                plan = con.execute("EXPLAIN QUERY PLAN " + sql, args).fetchall()
+                log.warning(f"Slow dashboard query {name}: {ms:.1f} ms; plan: {' | '.join(r[3] for r in plan)}")
+        if len(_cache) >= _CACHE_MAX_ENTRIES:
+            _cache.clear()
+        _cache[key] = rows
+        return rows
 
 def _page(title: str, body: str) -> bytes:
     return f"""<!doctype html>
@@ -65,7 +119,7 @@ a {{ text-decoration: none; }}
 </head><body>
 <h1>{html.escape(title)}</h1>
 <nav>
-<a href="/">Overview</a> | <a href="/tanks">Tanks</a> | <a href="/recent">Recent</a>
+<a href="/">Overview</a> | <a href="/tanks">Tanks</a> | <a href="/recent">Recent</a> | <a href="/windows">Weekly / monthly</a> | <a href="/player">Player</a> | <a href="/dbstats">DB stats</a>
 </nav>
 <hr>
 {body}
@@ -100,21 +154,31 @@ class Handler(BaseHTTPRequestHandler):
                 self._tanks()
             elif path == "/recent":
                 self._recent()
+            elif path == "/windows":
+                self._windows()
+            elif path == "/player":
+                self._player()
+            elif path == "/dbstats":
+                self._dbstats()
             else:
                 self._send_plain(404, "Not found")
         except Exception as e:
             self._send_plain(500, f"Error: {type(e).__name__}: {e}")
 
     def _overview(self):
-        with _db() as con:
-            champ = con.execute("""
-            SELECT s.id, s.player_name_raw, s.tank_name, s.score, s.created_at
-            FROM submissions s
-            ORDER BY s.score DESC, s.id ASC
-            LIMIT 1
-            """).fetchone()
-            tanks = con.execute("SELECT COUNT(*) FROM tanks").fetchone()[0]
-            subs = con.execute("SELECT COUNT(*) FROM submissions").fetchone()[0]
+        rows = _query("champion", """
+        SELECT r.submission_id, p.name_raw, t.name, r.score, s.created_at
+        FROM tank_records r
+        JOIN tanks t ON t.id = r.tank_id
+        JOIN submissions s ON s.id = r.submission_id
+        JOIN players p ON p.id = r.player_id
+        ORDER BY r.score DESC, r.submission_id ASC
+        LIMIT 1
+        """)
+        champ = rows[0] if rows else None
+        counters = dict(_query("counts", "SELECT name, value FROM stats_counters"))
+        tanks = counters.get("tanks", 0)
+        subs = counters.get("submissions", 0) + counters.get("archived_submissions", 0)
 
         body = f"""
 <p><b>Tanks:</b> {tanks} &nbsp; <b>Submissions:</b> {subs}</p>
@@ -124,27 +188,138 @@ class Handler(BaseHTTPRequestHandler):
         self._send_html(_page("Tank Highscores — Overview", body))
 
     def _tanks(self):
-        with _db() as con:
-            rows = con.execute("SELECT name, tier, type FROM tanks ORDER BY tier DESC, type, name").fetchall()
+        rows = _query("tanks", "SELECT name, tier, type FROM tanks ORDER BY tier DESC, type, name")
         trs = "".join(f"<tr><td>{html.escape(n)}</td><td>{t}</td><td>{html.escape(tp)}</td></tr>" for n,t,tp in rows)
         body = f"<h2>Tank roster</h2><table><tr><th>Name</th><th>Tier</th><th>Type</th></tr>{trs}</table>"
         self._send_html(_page("Tank Highscores — Tanks", body))
 
     def _recent(self):
-        with _db() as con:
-            rows = con.execute("""
-            SELECT id, player_name_raw, tank_name, score, created_at
-            FROM submissions
-            ORDER BY id DESC
-            LIMIT 50
-            """).fetchall()
+        qs = parse_qs(urlparse(self.path).query)
+        try:
+            before = int(qs.get("before", [""])[0])
+        except ValueError:
+            before = None
+        # Keyset page on id (see db.get_recent); one extra row tells whether an older page exists.
+        rows = _query("recent", """
+        SELECT s.id, p.name_raw, t.name, s.score, s.created_at
+        FROM all_submissions s
+        JOIN tanks t ON t.id = s.tank_id
+        JOIN players p ON p.id = s.player_id
+        WHERE s.id < ?
+        ORDER BY s.id DESC
+        LIMIT ?
+        """, (before if before is not None else 2**63 - 1, _RECENT_PAGE + 1))
+        more = len(rows) > _RECENT_PAGE
+        rows = rows[:_RECENT_PAGE]
         trs = "".join(
             f"<tr><td><code>#{r[0]}</code></td><td>{html.escape(r[1])}</td><td>{html.escape(r[2])}</td><td><b>{r[3]}</b></td><td>{html.escape(r[4])}Z</td></tr>"
             for r in rows
         )
-        body = f"<h2>Recent submissions (last 50)</h2><table><tr><th>ID</th><th>Player</th><th>Tank</th><th>Score</th><th>Time</th></tr>{trs}</table>"
+        links = []
+        if before is not None:
+            links.append(f'<a href="{self._link("/recent")}">« Newest</a>')
+        if more:
+            links.append(f'<a href="{self._link("/recent", before=rows[-1][0])}">Older »</a>')
+        nav = f"<p>{' | '.join(links)}</p>" if links else ""
+        title = "Recent submissions" if before is None else f"Submissions before #{before}"
+        body = f"<h2>{title}</h2><table><tr><th>ID</th><th>Player</th><th>Tank</th><th>Score</th><th>Time</th></tr>{trs}</table>{nav}"
         self._send_html(_page("Tank Highscores — Recent", body))
 
+    def _link(self, path: str, **params) -> str:
+        # Keep ?token= on generated links so query-string auth survives navigation.
+        token = parse_qs(urlparse(self.path).query).get("token", [""])[0]
+        if token:
+            params = {"token": token, **params}
+        return html.escape(path + ("?" + urlencode(params) if params else ""))
+
+    def _windows(self):
+        qs = parse_qs(urlparse(self.path).query)
+        kind = qs.get("kind", ["month"])[0]
+        if kind not in db.WINDOWS:
+            kind = "month"
+        periods = [r[0] for r in _query("window_periods", db.WINDOW_PERIODS_SQL, (kind, 12))]
+        period = qs.get("period", [""])[0] or db.window_period(kind)
+        # Rows are already best-first, so the first one is the period's champion.
+        rows = _query("window_tank_bests", db.WINDOW_BESTS_SQL, (kind, period))
+
+        kinds = " | ".join(
+            f"<b>{k}</b>" if k == kind else f'<a href="{self._link("/windows", kind=k)}">{k}</a>'
+            for k in db.WINDOWS
+        )
+        plinks = " ".join(
+            f"<b>{html.escape(p)}</b>" if p == period else f'<a href="{self._link("/windows", kind=kind, period=p)}">{html.escape(p)}</a>'
+            for p in periods
+        )
+        if rows:
+            tank, tier, tp, sid, player, score, created = rows[0]
+            champ = f"<b>{score}</b> — {html.escape(player)} ({html.escape(tank)}, tier {tier} {html.escape(tp)}) <code>#{sid}</code> {html.escape(created)}Z"
+        else:
+            champ = "No submissions in this period."
+        trs = "".join(
+            f"<tr><td>{html.escape(tank)}</td><td>{tier}</td><td>{html.escape(tp)}</td><td><b>{score}</b></td><td>{html.escape(player)}</td><td><code>#{sid}</code></td><td>{html.escape(created)}Z</td></tr>"
+            for tank, tier, tp, sid, player, score, created in rows
+        )
+        body = f"""<p>Window: {kinds}</p>
+<p>Periods: {plinks or 'none yet'}</p>
+<h2>{html.escape(kind.title())} {html.escape(period)}</h2>
+<p>{champ}</p>
+<table><tr><th>Tank</th><th>Tier</th><th>Type</th><th>Score</th><th>Player</th><th>ID</th><th>Time</th></tr>{trs}</table>"""
+        self._send_html(_page("Tank Highscores — Windows", body))
+
+    def _player(self):
+        qs = parse_qs(urlparse(self.path).query)
+        name = qs.get("name", [""])[0].strip()[:64]
+        token = html.escape(qs.get("token", [""])[0])
+        form = f"""<form method="get" action="/player">
+<input type="hidden" name="token" value="{token}">
+<input name="name" value="{html.escape(name)}" placeholder="Player name"> <button>Show</button>
+</form>"""
+        if not name:
+            self._send_html(_page("Tank Highscores — Player", form))
+            return
+
+        norm = utils.normalize_player(name)
+        names = _query("player_names", db.PLAYER_NAMES_SQL, (norm,))
+        bests = _query("player_bests", db.PLAYER_BESTS_SQL, (norm,)) if names else []
+        buckets = _query("player_buckets", db.PLAYER_BUCKETS_SQL, (norm,)) if names else []
+        prof = db.profile_from_rows(names, bests, buckets)
+        if not prof:
+            self._send_html(_page("Tank Highscores — Player", form + f"<p>No submissions found for {html.escape(name)}.</p>"))
+            return
+
+        brs = "".join(
+            f"<tr><td>{tier}</td><td>{html.escape(tp)}</td><td><b>#{rank}</b></td><td>{score}</td><td>{html.escape(tank)}</td></tr>"
+            for tier, tp, tank, score, rank in prof["buckets"]
+        )
+        trs = "".join(
+            f"<tr><td>{html.escape(tank)}</td><td>{tier}</td><td>{html.escape(tp)}</td><td><b>{score}</b></td><td>#{rank}</td><td><code>#{sid}</code></td><td>{html.escape(created)}Z</td></tr>"
+            for tank, tier, tp, sid, score, created, rank in prof["bests"]
+        )
+        body = f"""{form}
+<h2>{html.escape(prof['name'])}</h2>
+<p><b>Submissions:</b> {prof['submissions']} &nbsp; <b>Tanks played:</b> {len(prof['bests'])} &nbsp; <b>Records held:</b> {len(prof['records'])}</p>
+<h3>Tier × Type buckets</h3>
+<table><tr><th>Tier</th><th>Type</th><th>Rank</th><th>Best</th><th>Tank</th></tr>{brs}</table>
+<h3>Personal bests</h3>
+<table><tr><th>Tank</th><th>Tier</th><th>Type</th><th>Score</th><th>Rank</th><th>ID</th><th>Time</th></tr>{trs}</table>"""
+        self._send_html(_page("Tank Highscores — Player", body))
+
+    def _dbstats(self):
+        rows = db.query_stats()
+        fmt = lambda ms: "&gt;1000" if ms == float("inf") else f"{ms:.1f}"
+        trs = "".join(
+            f"<tr><td><code>{html.escape(r['name'])}</code></td><td>{r['calls']}</td><td>{r['rows']}</td>"
+            f"<td>{r['avg_ms']:.2f}</td><td>≤{fmt(r['p50_ms'])}</td><td>≤{fmt(r['p95_ms'])}</td><td>{r['max_ms']:.1f}</td>"
+            f"<td>{r['total_ms']:.0f}</td><td>{r['slow']}</td></tr>"
+            for r in rows
+        )
+        state = "enabled" if config.DB_STATS_ENABLED else "disabled (set DB_STATS_ENABLED=1)"
+        c = cache_stats()
+        body = f"""<p>Instrumentation {state}; slow threshold {config.DB_SLOW_QUERY_MS:g} ms. Times in ms, since bot start.
+Dashboard cache: {c['hits']} hits / {c['misses']} misses.</p>
+<table><tr><th>Query</th><th>Calls</th><th>Rows</th><th>Avg</th><th>p50</th><th>p95</th><th>Max</th><th>Total</th><th>Slow</th></tr>{trs}</table>"""
+        self._send_html(_page("Tank Highscores — DB stats", body))
+
     def _send_html(self, data: bytes):
         self.send_response(200)
         self.send_header("Content-Type", "text/html; charset=utf-8")